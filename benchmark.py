@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmarks for datatree. Run as
+
+    python benchmark.py [--scale 1.0] [--only deep,large_csv] [--output results.jsonl]
+
+Each benchmark prints one JSON object per line, so results can be compared
+between runs. Tree benchmarks generate a synthetic folder, then report load
+time, peak memory during the load, lookup latency and serialization throughput.
+'''
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from shutil import rmtree
+
+import yaml
+import datatree as module
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, module.ContainerNode):
+            stack.extend(node)
+    return count
+
+def records(n):
+    return [dict(title='Paper %d' % k, author='Author %d' % (k % 100), year=1990 + k % 30)
+            for k in range(n)]
+
+def write_yaml(path, data):
+    stream = open(path, 'w')
+    yaml.dump(data, stream)
+    stream.close()
+
+# generators of synthetic folders; each returns the keyword arguments for DataTree
+
+def wide_flat(root, n):
+    '''
+    One folder with n small YAML files.
+    '''
+    for k in range(n):
+        write_yaml(os.path.join(root, 'doc%d.yaml' % k), dict(title='Document %d' % k, number=k))
+    return {}
+
+def deep_nesting(root, n):
+    '''
+    A chain of n nested folders, each with one small YAML file.
+    '''
+    path = root
+    for k in range(n):
+        path = os.path.join(path, 'level%d' % k)
+        os.makedirs(path)
+        write_yaml(os.path.join(path, 'doc.yaml'), dict(depth=k))
+    return {}
+
+def many_small_yaml(root, n):
+    '''
+    n small YAML files spread over folders of 100 files.
+    '''
+    for k in range(n):
+        folder = os.path.join(root, 'folder%d' % (k // 100))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        write_yaml(os.path.join(folder, 'doc%d.yaml' % k), records(3)[k % 3])
+    return {}
+
+def large_multidoc_yaml(root, n):
+    '''
+    One YAML file with n documents.
+    '''
+    stream = open(os.path.join(root, 'log.yaml'), 'w')
+    yaml.dump_all(records(n), stream)
+    stream.close()
+    return {}
+
+def large_csv(root, n):
+    '''
+    One CSV file with n rows.
+    '''
+    stream = open(os.path.join(root, 'table.csv'), 'w')
+    writer = csv.writer(stream)
+    writer.writerow(['title', 'author', 'year'])
+    for record in records(n):
+        writer.writerow([record['title'], record['author'], record['year']])
+    stream.close()
+    return {}
+
+def large_json_list(root, n):
+    '''
+    One JSON file with a list of n records named by a primary key.
+    '''
+    data = records(n)
+    for (k, record) in enumerate(data):
+        record['slug'] = 'paper%d' % k
+    stream = open(os.path.join(root, 'papers.json'), 'w')
+    json.dump(data, stream)
+    stream.close()
+    return dict(primary_keys=['slug'])
+
+SHAPES = [(wide_flat, 2000), (deep_nesting, 200), (many_small_yaml, 2000),
+          (large_multidoc_yaml, 5000), (large_csv, 50000), (large_json_list, 20000)]
+
+def leaf_urls(tree, count):
+    urls = []
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, module.ContainerNode):
+            stack.extend(node)
+        else:
+            urls.append(node.get_absolute_url())
+    random.Random(0).shuffle(urls)
+    return urls[:count]
+
+def bench_tree(generator, n, repeat=1000):
+    root = tempfile.mkdtemp(prefix='datatree-benchmark-')
+    try:
+        options = generator(root, n)
+        tracemalloc.start()
+        start = time.perf_counter()
+        tree = module.DataTree(root, **options)
+        load = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        urls = leaf_urls(tree, repeat)
+        start = time.perf_counter()
+        for url in urls:
+            tree.get_by_url(url)
+        first_lookup = (time.perf_counter() - start) / len(urls)
+        start = time.perf_counter()
+        for url in urls:
+            tree.get_by_url(url)
+        lookup = (time.perf_counter() - start) / len(urls)
+
+        start = time.perf_counter()
+        text = str(tree.root)
+        serialize = time.perf_counter() - start
+
+        snapshot = os.path.join(root, 'tree.snapshot')
+        tree.save_snapshot(snapshot)
+        start = time.perf_counter()
+        module.DataTree.load_snapshot(snapshot)
+        snapshot_load = time.perf_counter() - start
+        return dict(benchmark=generator.__name__, size=n, nodes=count_nodes(tree.root),
+                    load_seconds=load, snapshot_load_seconds=snapshot_load, peak_bytes=peak,
+                    first_lookup_seconds=first_lookup, lookup_seconds=lookup,
+                    serialize_bytes_per_second=len(text) / serialize if serialize else None)
+    finally:
+        rmtree(root)
+
+def bench_memory(n=100000):
+    '''
+    Bytes per node of a list of n records with three fields each.
+    '''
+    data = records(n)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = module.parse_object('root', data)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = count_nodes(root)
+    return dict(benchmark='memory', nodes=nodes, bytes_per_node=float(after - before) / nodes)
+
+def bench_wide_container(n=1000000):
+    '''
+    Seconds to add n literal children to one container, one at a time and in bulk.
+    '''
+    nodes = [module.LiteralNode('id%d' % k) for k in range(n)]
+    node = module.ContainerNode('root')
+    start = time.perf_counter()
+    for child in nodes:
+        node.add_child(child)
+    one_by_one = time.perf_counter() - start
+
+    nodes = [module.LiteralNode('id%d' % k) for k in range(n)]
+    node = module.ContainerNode('root')
+    start = time.perf_counter()
+    node.add_children(nodes)
+    bulk = time.perf_counter() - start
+    return dict(benchmark='wide_container', children=n, add_child=one_by_one, add_children=bulk)
+
+def parse_object_recursive(name, obj, primary_keys=[]):
+    '''
+    Recursive version of parse_object, for comparison.
+    '''
+    if isinstance(primary_keys, str):
+        primary_keys = [primary_keys]
+    if not isinstance(obj, (dict, list)):
+        node = module.LiteralNode(name)
+        node.set_data(obj)
+        return node
+    root = module.ListNode(name) if isinstance(obj, list) else module.ContainerNode(name)
+    root.add_children(parse_object_recursive(key, value, primary_keys)
+                      for (key, value) in module._items(obj, primary_keys))
+    return root
+
+def bench_parse(n=100000, depth=200):
+    '''
+    Seconds for parse_object and parse_object_recursive on a wide list of n
+    records and on n / depth documents nested depth levels deep.
+    '''
+    wide = records(n)
+    deep = []
+    for k in range(max(1, n // depth)):
+        obj = dict(value=k)
+        for level in range(depth):
+            obj = dict(level=obj)
+        deep.append(obj)
+    output = dict(benchmark='parse', size=n, depth=depth)
+    for function in [module.parse_object, parse_object_recursive]:
+        start = time.perf_counter()
+        function('root', wide)
+        output[function.__name__ + '_wide'] = time.perf_counter() - start
+        start = time.perf_counter()
+        function('root', deep)
+        output[function.__name__ + '_deep'] = time.perf_counter() - start
+    return output
+
+def bench_columns(n=100000):
+    '''
+    Seconds to sum a field over n typed records, leaf by leaf and with to_columns.
+    '''
+    root = module.parse_object('root', records(n), typed=True)
+    start = time.perf_counter()
+    total = sum([child.year.get_data() for child in root])
+    by_leaf = time.perf_counter() - start
+    start = time.perf_counter()
+    total = root.to_columns(['year'])['year'].sum()
+    columns = time.perf_counter() - start
+    return dict(benchmark='columns', size=n, by_leaf=by_leaf, to_columns=columns)
+
+class Counter(object):
+    '''
+    Counts the stat and listing calls made through os while it is active,
+    including those of the os.DirEntry objects made by os.scandir.
+    '''
+    def __init__(self):
+        self.calls = dict(stat=0, listdir=0, scandir=0)
+
+    def __enter__(self):
+        self.saved = (os.stat, os.listdir, os.scandir)
+        (stat, listdir, scandir) = self.saved
+        calls = self.calls
+        def count_stat(*args, **kwargs):
+            calls['stat'] += 1
+            return stat(*args, **kwargs)
+        def count_listdir(*args, **kwargs):
+            calls['listdir'] += 1
+            return listdir(*args, **kwargs)
+        class Entry(object):
+            def __init__(self, entry):
+                self.entry = entry
+                self.name = entry.name
+                self.path = entry.path
+            def is_dir(self):
+                return self.entry.is_dir()
+            def is_file(self):
+                return self.entry.is_file()
+            def stat(self):
+                calls['stat'] += 1
+                return self.entry.stat()
+        class Entries(object):
+            def __init__(self, path):
+                calls['scandir'] += 1
+                self.entries = scandir(path)
+            def __enter__(self):
+                return (Entry(entry) for entry in self.entries)
+            def __exit__(self, *args):
+                self.entries.close()
+        (os.stat, os.listdir, os.scandir) = (count_stat, count_listdir, Entries)
+        return self
+
+    def __exit__(self, *args):
+        (os.stat, os.listdir, os.scandir) = self.saved
+
+LEGACY_DISPATCHER = [re.compile(r'^.+\.ya?ml$'), re.compile(r'^.+\.csv$'), re.compile(r'^.+\.json$')]
+
+def legacy_walk(path):
+    '''
+    The walk of FolderReader before os.scandir: listdir, then isdir and isfile
+    on every entry, a regular expression per reader and a stat per reader.
+    '''
+    count = 0
+    stack = [path]
+    while stack:
+        folder = stack.pop()
+        for entry in os.listdir(folder):
+            fullname = os.path.join(folder, entry)
+            if os.path.isdir(fullname):
+                os.stat(fullname)
+                stack.append(fullname)
+            elif os.path.isfile(fullname):
+                for pattern in LEGACY_DISPATCHER:
+                    if pattern.match(fullname):
+                        os.stat(fullname)
+                        count += 1
+                        break
+    return count
+
+def bench_walk(n=20000):
+    '''
+    Seconds and stat calls to list a folder tree of n data files and n other
+    files, in folders of 100, before and after os.scandir.
+    '''
+    root = tempfile.mkdtemp(prefix='datatree-benchmark-')
+    try:
+        for k in range(n):
+            folder = os.path.join(root, 'folder%d' % (k // 100))
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            for name in ['doc%d.yaml' % k, 'notes%d.txt' % k]:
+                open(os.path.join(folder, name), 'w').close()
+        output = dict(benchmark='walk', size=n)
+        walks = [('legacy', lambda: legacy_walk(root)),
+                 ('scandir', lambda: module.FolderReader(root)._plan()),
+                 ('breadth_first', lambda: module.FolderReader(root, breadth_first=True)._plan())]
+        for (name, walk) in walks:
+            with Counter() as counter:
+                walk()
+            start = time.perf_counter()
+            walk()
+            output[name + '_seconds'] = time.perf_counter() - start
+            output[name + '_stats'] = counter.calls['stat']
+        return output
+    finally:
+        rmtree(root)
+
+def benchmarks(scale=1.0):
+    '''
+    Return (name, function) pairs for all benchmarks at the given scale.
+    '''
+    output = []
+    for (generator, n) in SHAPES:
+        output.append((generator.__name__,
+                       lambda generator=generator, n=n: bench_tree(generator, max(1, int(n * scale)))))
+    output.append(('memory', lambda: bench_memory(max(1, int(100000 * scale)))))
+    output.append(('parse', lambda: bench_parse(max(1, int(100000 * scale)))))
+    output.append(('columns', lambda: bench_columns(max(1, int(100000 * scale)))))
+    output.append(('walk', lambda: bench_walk(max(1, int(20000 * scale)))))
+    output.append(('wide_container', lambda: bench_wide_container(max(1, int(1000000 * scale)))))
+    return output
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Run datatree benchmarks.')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the size of every benchmark')
+    parser.add_argument('--only', default='', help='comma separated names of benchmarks to run')
+    parser.add_argument('--output', default=None, help='append results to this file as JSON lines')
+    options = parser.parse_args(arguments)
+    only = [name for name in options.only.split(',') if name]
+    for (name, function) in benchmarks(options.scale):
+        if only and not name in only:
+            continue
+        line = json.dumps(function(), sort_keys=True)
+        print(line)
+        sys.stdout.flush()
+        if options.output is not None:
+            stream = open(options.output, 'a')
+            stream.write(line + '\n')
+            stream.close()
+
+if __name__=='__main__':
+    main()
@@ -14,7 +14,29 @@ import yaml
 import json
 import csv
 import os
-from functools import reduce
+import io
+import sys
+import stat
+import threading
+import time
+import operator
+import weakref
+import collections
+import asyncio
+from array import array
+import pickle
+import hashlib
+import mmap
+import struct
+from functools import reduce, partial, lru_cache
+from itertools import chain
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # upgrading to Python 3, where all strings are unicode
 def unicode(x):
@@ -41,10 +63,61 @@ except:
             slug = '_'+slug
         return slug 
 
-def parse_object(name, obj, primary_keys=[]):
+# number of names whose slugs are remembered by admissible_slug
+SLUG_CACHE_SIZE = 65536
+
+_normalizer = slugify
+
+def set_normalizer(normalizer=None):
+    '''
+    Turn names into slugs with normalizer instead of slugify, or with slugify
+    again if normalizer is None. The slugs it returns are still checked by
+    admissible_slug. Nodes that already exist keep their names.
+    '''
+    global _normalizer
+    _normalizer = slugify if normalizer is None else normalizer
+    admissible_slug.cache_clear()
+
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
+def admissible_slug(name):
+    '''
+    Return the slug of name. Raise NameError if it cannot be a node name.
+
+    The same names recur in every file, such as the fields of records and the
+    header of a CSV file, so slugs are cached by name. cache_info() reports
+    hits and misses.
+    '''
+    slug = _normalizer(name)
+    if (not SLUG_REGEX.match(slug)) or (slug in RESERVED_WORDS) or (RESERVED_WORDS_REGEX.match(slug)):
+        raise NameError('%s is not an admissible name. node = %s' % (slug, name))
+    return sys.intern(slug)
+
+def item_name(position, value, primary_keys=[]):
+    '''
+    Name of a list item: the value of its first primary key, or id<position>.
+    The value is returned as it is, so that a node named by it keeps it as its
+    verbose name, see ListNode.get_by_key.
+    '''
+    if isinstance(primary_keys, str):
+        primary_keys = [primary_keys]
+    if isinstance(value, dict):
+        for field in primary_keys:
+            if field in value:
+                return value[field]
+    return 'id%s' % position
+
+def parse_object(name, obj, primary_keys=[], typed=False):
     '''
     Parse a python object into a YAML tree.
 
+    Nested dicts and lists are walked with an explicit stack, so documents can
+    be nested arbitrarily deep. Each node is added to its parent when it is
+    complete, in the same order as a recursive walk, so names and errors do
+    not depend on the depth.
+
+    With typed=True, literals keep their Python type in TypedLiteralNodes, and
+    lists of numbers become ArrayNodes.
+
     >>> root = parse_object('root', {'a': 1, 'b': {'c': 2, 'd': 3}})
     >>> root.__name__
     'root'
@@ -65,32 +138,70 @@ def parse_object(name, obj, primary_keys=[]):
     '''
     if isinstance(primary_keys, str):
         primary_keys = [primary_keys]
+    literal = TypedLiteralNode if typed else LiteralNode
+    if not isinstance(obj, (dict, list)) or (typed and numeric_array(obj) is not None):
+        return _leaf(literal, name, obj)
+    root = ListNode(name) if isinstance(obj, list) else ContainerNode(name)
+    stack = [(root, _items(obj, primary_keys))]
+    while stack:
+        (container, items) = stack[-1]
+        for (key, value) in items:
+            if isinstance(value, (dict, list)) and not (typed and numeric_array(value) is not None):
+                node = ListNode(key) if isinstance(value, list) else ContainerNode(key)
+                stack.append((node, _items(value, primary_keys)))
+                break
+            container.add_child(_leaf(literal, key, value))
+        else:
+            stack.pop()
+            if stack:
+                stack[-1][0].add_child(container)
+    return root
+
+def _leaf(literal, name, value):
+    '''
+    A literal node, or an ArrayNode for a list of numbers in typed mode.
+    '''
+    if isinstance(value, list):
+        return ArrayNode(name, numeric_array(value))
+    node = literal(name)
+    node.set_data(value)
+    return node
+
+def numeric_array(values):
+    '''
+    Return a list of integers as an int64 array, or a list of numbers with at
+    least one float as a float64 array. The array is a NumPy array, or an
+    array.array if NumPy is not installed. Return None for any other value.
+    '''
+    if not isinstance(values, list) or not values:
+        return None
+    types = set(map(type, values))
+    if types == {int}:
+        (dtype, typecode) = ('int64', 'q')
+    elif float in types and types <= {int, float}:
+        (dtype, typecode) = ('float64', 'd')
+    else:
+        return None
+    try:
+        if numpy is not None:
+            return numpy.array(values, dtype=dtype)
+        return array(typecode, values)
+    except OverflowError:
+        return None
+
+def _items(obj, primary_keys):
+    '''
+    (name, value) pairs of the children of a dict or a list.
+    '''
     if isinstance(obj, dict):
-        root = ContainerNode(name)
         for (key, value) in obj.items():
             if key is None:
                 print("%s: %s" % (key, value))
                 raise NameError
-            node = parse_object(key, value, primary_keys)
-            root.add_child(node)
-        return root
-    elif isinstance(obj, list):
-        root = ContainerNode(name)
-        for (key, value) in zip(range(len(obj)), obj):
-            nodename = 'id%s' % key
-            for field in primary_keys:
-                try:
-                    nodename = value[field]
-                    break
-                except:
-                    continue
-            node = parse_object(nodename, value, primary_keys)
-            root.add_child(node)
-        return root
+            yield (key, value)
     else:
-        node = LiteralNode(name)
-        node.set_data(obj)
-        return node
+        for (position, value) in enumerate(obj):
+            yield (item_name(position, value, primary_keys), value)
 
 class Node(object):
     '''
@@ -99,29 +210,66 @@ class Node(object):
         2. literal
 
     Each node has a unique URL (not yet implemented).
+
+    Nodes use __slots__ to keep large trees small. The __meta__ dictionary is
+    only created when it is first used: until then, _meta holds the verbose
+    name if it differs from the slug, or None.
     '''
+    __slots__ = ('__name__', '__parent__', '_meta', '_url')
 
     def __init__(self, name):
-        slug = slugify(name)
-        if (not SLUG_REGEX.match(slug)) or (slug in RESERVED_WORDS) or (RESERVED_WORDS_REGEX.match(slug)):
-            raise NameError('%s is not an admissible name. node = %s' % (slug, name))
-        self.__name__ = slug
-        self.__meta__ = dict(verbose_name=name)
-        self.__data__ = None
-        self.__children__ = None
+        # names that are not strings, such as integer primary keys, are slugged as strings
+        self.__name__ = admissible_slug(name if isinstance(name, str) else str(name))
+        self._meta = None if name == self.__name__ else name
         self.__parent__ = None
+        self._url = None
+
+    def _default_meta(self):
+        return dict(verbose_name=self.get_verbose_name())
+
+    @property
+    def __meta__(self):
+        if not isinstance(self._meta, dict):
+            self._meta = self._default_meta()
+        return self._meta
 
     def __bool__(self):
         # default object is True
         return True
 
     def get_absolute_url(self):
-        if self.__parent__ is None:
-            return '/'
-        elif self.__parent__.get_absolute_url() == '/':
-            return '/%s' % self.__name__
-        else:
-            return '%s/%s' % (self.__parent__.get_absolute_url(), self.__name__)
+        '''
+        Return the URL of the node. URLs are cached and forgotten when a node
+        is moved, so a node with a cached URL always has ancestors with cached URLs.
+        '''
+        if self._url is not None:
+            return self._url
+        chain = []
+        node = self
+        while node is not None and node._url is None:
+            chain.append(node)
+            node = node.__parent__
+        for node in reversed(chain):
+            if node.__parent__ is None:
+                node._url = '/'
+            elif node.__parent__._url == '/':
+                node._url = '/' + node.__name__
+            else:
+                node._url = node.__parent__._url + '/' + node.__name__
+        return self._url
+
+    def _forget_urls(self):
+        '''
+        Forget the cached URLs of this node and its descendants.
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._url is None:
+                continue
+            node._url = None
+            if isinstance(node, ContainerNode):
+                stack.extend(node.__children__.values())
 
     def get_relative_url(self, other):
         return os.path.relpath(self.get_absolute_url(), other.get_absolute_url())
@@ -134,10 +282,21 @@ class Node(object):
         return self.__meta__[key]
 
     def get_verbose_name(self):
-        return self.__meta__['verbose_name']
+        if self._meta is None:
+            return self.__name__
+        elif isinstance(self._meta, dict):
+            return self._meta['verbose_name']
+        else:
+            return self._meta
 
 
 class LiteralNode(Node):
+    __slots__ = ('__data__',)
+
+    def __init__(self, name):
+        super(LiteralNode, self).__init__(name)
+        self.__data__ = None
+
     def __bool__(self):
         # literal node is True if has data
         return (self.__data__ is not None) and (not self.__data__ == "")
@@ -150,6 +309,8 @@ class LiteralNode(Node):
 
     def set_data(self, value):
         self.__data__ = str(value)
+        if self.__parent__ is not None:
+            _notify(self.__parent__, 'data', new=(self,))
 
     def __unicode__(self):
         return self.get_data()
@@ -157,6 +318,104 @@ class LiteralNode(Node):
     def __str__(self):
         return self.__unicode__()
 
+# held while a lazy placeholder is swapped for the node it loaded, not while loading
+_RESOLVE_LOCK = threading.Lock()
+
+# indexes that are kept up to date as nodes change, see _notify:
+# id of the root of a tree -> (root, weak references to its observers)
+_OBSERVERS = {}
+
+def _root(node):
+    while node.__parent__ is not None:
+        node = node.__parent__
+    return node
+
+def _observe(observer, root):
+    '''
+    Pass every change to the nodes in the tree of root to observer._node_changed
+    while observer is in use.
+    '''
+    key = id(root)
+    def forget(reference):
+        if key in _OBSERVERS:
+            _unobserve(reference, root)
+    _OBSERVERS.setdefault(key, (root, []))[1].append(weakref.ref(observer, forget))
+
+def _unobserve(observer, root):
+    '''
+    Stop passing changes in the tree of root to observer, or to the observer of a weak reference.
+    '''
+    entry = _OBSERVERS.get(id(root))
+    if entry is None:
+        return
+    references = [reference for reference in entry[1] if not (reference is observer or reference() is observer)]
+    if references:
+        _OBSERVERS[id(root)] = (root, references)
+    else:
+        del _OBSERVERS[id(root)]
+
+# weak references to the memory budgets in use, touched as file nodes are accessed
+_BUDGETS = []
+
+def _notify(container, event, old=(), new=()):
+    '''
+    Tell the observers that the children old of container were replaced by new.
+
+    event is 'add', 'remove' or 'reset' when children are added, removed or
+    replaced all at once, 'load' or 'unload' when a lazy placeholder is swapped
+    for the node it read or back, and 'data' when the data of the literals new
+    changed. Only the observers of the tree of container are told, with the
+    names on the path from the root to container; they check for themselves
+    whether container is below the node they watch.
+    '''
+    if not _OBSERVERS:
+        return
+    entry = _OBSERVERS.get(id(_root(container)))
+    if entry is None:
+        return
+    names = []
+    node = container
+    while node.__parent__ is not None:
+        names.append(node.__name__)
+        node = node.__parent__
+    names.reverse()
+    for reference in entry[1]:
+        observer = reference()
+        if observer is not None:
+            observer._node_changed(names, container, event, old, new)
+
+def _names_below(anchor, names, container):
+    '''
+    Return the names on the path from anchor down to container, or None if
+    container is not anchor or a node below it. names are the names on the
+    path from the top of the tree to container, as given by _notify.
+    '''
+    url = anchor.get_absolute_url()
+    parts = [] if url == '/' else url[1:].split('/')
+    if names[:len(parts)] != parts:
+        return None
+    node = anchor
+    for name in names[len(parts):]:
+        if not isinstance(node, ContainerNode):
+            return None
+        node = node.__children__.get(name)
+    return names[len(parts):] if node is container else None
+
+class TypedLiteralNode(LiteralNode):
+    '''
+    A literal that keeps the type of its data, such as int, float, bool, None
+    or date, instead of converting it to a string.
+    '''
+    __slots__ = ()
+
+    def set_data(self, value):
+        self.__data__ = value
+        if self.__parent__ is not None:
+            _notify(self.__parent__, 'data', new=(self,))
+
+    def __unicode__(self):
+        return str(self.__data__)
+
 class ContainerNode(Node):
     '''
     Children of ContainerNode can be addressed as
@@ -168,17 +427,38 @@ class ContainerNode(Node):
 
         node.add_child(other_node)
 
+    or, for many children at once,
+
+        node.add_children(nodes)
+
     Container nodes are also iterable:
 
         for child in node:
             pass
 
+    Children are kept in insertion order in __children__. The ordering list in
+    __meta__ is created from it when __meta__ is first used, and from then on
+    it is the one that iteration follows.
     '''
+    __slots__ = ('__children__',)
+
     def __init__(self, name):
         super(ContainerNode, self).__init__(name)
         self.__children__ = {}
+
+    def _default_meta(self):
+        meta = super(ContainerNode, self)._default_meta()
         # store ordering in __meta__ so that applications can change that if they want
-        self.__meta__['ordering'] = []
+        meta['ordering'] = list(self.__children__)
+        return meta
+
+    def _keys(self):
+        '''
+        Return the names of the children in order.
+        '''
+        if isinstance(self._meta, dict) and 'ordering' in self._meta:
+            return self._meta['ordering']
+        return self.__children__.keys()
 
     def __bool__(self):
         # container node is True if has children
@@ -190,17 +470,90 @@ class ContainerNode(Node):
         elif isinstance(item, Node):
             return item in self.__children__.values()
 
+    def remove_child(self, name):
+        '''
+        Detach the child called name and return it.
+        '''
+        if not name.lower() in self.__children__:
+            raise KeyError('%s is not a child node. node = %s' % (name, self.get_absolute_url()))
+        node = self.__children__.pop(name.lower())
+        if isinstance(self._meta, dict):
+            self._meta['ordering'].remove(node.__name__)
+        if node._url is not None:
+            node._forget_urls()
+        node.__parent__ = None
+        _notify(self, 'remove', old=(node,))
+        return node
+
     def add_child(self, node):
-        if node.__name__ in [child.__name__ for child in self]:
+        if node.__name__ in self.__children__:
             raise NameError('Children must have unique names. node = %s' % self.get_absolute_url())
         if node.__parent__ is not None:
             raise ValueError('Child cannot have multiple parents. node = %s' % self.get_absolute_url())
         self.__children__[node.__name__] = node
-        self.__meta__['ordering'].append(node.__name__)
+        if isinstance(self._meta, dict):
+            self._meta['ordering'].append(node.__name__)
+        if node._url is not None:
+            node._forget_urls()
         node.__parent__ = self
+        _notify(self, 'add', new=(node,))
+
+    def add_children(self, nodes):
+        '''
+        Add each node in nodes as a child, in order. Checks and errors are the same
+        as for add_child, and nodes can be a generator that builds them one at a time.
+        '''
+        children = self.__children__
+        ordering = self._meta['ordering'] if isinstance(self._meta, dict) else None
+        # only kept if there is anyone to tell
+        added = [] if _OBSERVERS else None
+        for node in nodes:
+            name = node.__name__
+            if name in children:
+                raise NameError('Children must have unique names. node = %s' % self.get_absolute_url())
+            if node.__parent__ is not None:
+                raise ValueError('Child cannot have multiple parents. node = %s' % self.get_absolute_url())
+            children[name] = node
+            if ordering is not None:
+                ordering.append(name)
+            if node._url is not None:
+                node._forget_urls()
+            node.__parent__ = self
+            if added is not None:
+                added.append(node)
+        if added:
+            _notify(self, 'add', new=added)
+
+    def _replace_children(self, nodes):
+        '''
+        Make nodes the children, in order, in one step. Children that are not
+        among nodes are detached.
+        '''
+        children = {}
+        for node in nodes:
+            if node.__name__ in children:
+                raise NameError('Children must have unique names. node = %s' % self.get_absolute_url())
+            children[node.__name__] = node
+        old = self.__children__
+        removed = [node for node in old.values() if children.get(node.__name__) is not node]
+        added = [node for node in nodes if old.get(node.__name__) is not node]
+        for node in removed:
+            if node.__parent__ is self:
+                if node._url is not None:
+                    node._forget_urls()
+                node.__parent__ = None
+        for node in nodes:
+            if node.__parent__ is not self:
+                if node._url is not None:
+                    node._forget_urls()
+                node.__parent__ = self
+        self.__children__ = children
+        if isinstance(self._meta, dict):
+            self._meta['ordering'] = list(children)
+        _notify(self, 'reset', removed, added)
 
     def __iter__(self):
-        return iter([self.__children__[key] for key in self.__meta__['ordering']])
+        return (self._resolve(key) for key in self._keys())
 
     def __len__(self):
         '''
@@ -209,11 +562,61 @@ class ContainerNode(Node):
         return len(self.__children__)
 
     def children_as_dictionary(self):
+        for key in list(self.__children__.keys()):
+            self._resolve(key)
         return self.__children__
 
+    def to_columns(self, fields=None, missing=None, infer_types=False):
+        '''
+        Gather the data at each path in fields below every child into a column,
+        in one pass over the children. Returns a dictionary from field to
+        column; see to_column. Paths are relative, as in Query, and a child
+        that has no data at a path gets missing instead. Pass float('nan') as
+        missing to keep numeric columns with gaps numeric.
+
+        fields default to the names of the literal children of all children.
+
+            papers.to_columns(['year', 'author/name'])
+        '''
+        if fields is None:
+            fields = {}
+            for child in self:
+                if isinstance(child, ContainerNode):
+                    for key in child._keys():
+                        if not isinstance(child.__children__.get(key), (ContainerNode, LazyNode)):
+                            fields[key] = True
+        fields = list(fields)
+        paths = [[part.lower() for part in field.split('/') if part] for field in fields]
+        columns = [[] for field in fields]
+        for child in self:
+            for (path, column) in zip(paths, columns):
+                node = child
+                for part in path:
+                    if not isinstance(node, ContainerNode):
+                        node = None
+                        break
+                    found = node.__children__.get(part)
+                    if found is None or isinstance(found, LazyNode):
+                        # rows of tables, items of arrays and placeholders
+                        found = node[part] if part in node else None
+                    node = found
+                    if node is None:
+                        break
+                column.append(missing if node is None or isinstance(node, ContainerNode) else node.__data__)
+        return dict([(field, to_column(column, infer_types)) for (field, column) in zip(fields, columns)])
+
+    def to_dataframe(self, fields=None, missing=None, infer_types=False):
+        '''
+        Return the columns of to_columns as a pandas DataFrame, indexed by the
+        names of the children. Needs pandas.
+        '''
+        import pandas
+        return pandas.DataFrame(self.to_columns(fields, missing, infer_types), index=list(self._keys()))
+
     def get_dictionary(self):
         output = {}
-        for key, value in self.__children__.items():
+        for key in list(self.__children__.keys()):
+            value = self._resolve(key)
             try:
                 output[key] = value.get_dictionary()
             except:
@@ -221,18 +624,52 @@ class ContainerNode(Node):
         return output
 
     def __unicode__(self):
-        return json.dumps(self.get_dictionary())
+        return json.dumps(self.get_dictionary(), default=str)
 
     def __str__(self):
         return self.__unicode__()
 
+    def _resolve(self, key):
+        '''
+        Return the child stored under key, replacing a lazy placeholder with the real node.
+        '''
+        child = self.__children__[key]
+        if isinstance(child, LazyNode):
+            node = child.load()
+            with _RESOLVE_LOCK:
+                current = self.__children__.get(key)
+                if current is not child:
+                    # another thread resolved the placeholder first, or it was removed
+                    return node if current is None else current
+                if node._url is not None:
+                    node._forget_urls()
+                node.__parent__ = self
+                self.__children__[key] = node
+            _notify(self, 'load', (child,), (node,))
+            return node
+        if _BUDGETS and isinstance(child._meta, dict) and 'mtime' in child._meta:
+            # a budget may be collected while this runs
+            for ref in list(_BUDGETS):
+                budget = ref()
+                if budget is not None:
+                    budget.touch(child)
+        return child
+
     def __getattr__(self, name):
         if name.lower() in self.__children__:
-            return self.__children__[name.lower()]
+            return self._resolve(name.lower())
         else:
             raise KeyError('%s is not a child node. node = %s' % (name, self.get_absolute_url()))
 
     def __getitem__(self, key):
+        '''
+        Return a child by name, by position in the ordering or, for a slice,
+        the list of children in it.
+        '''
+        if isinstance(key, int):
+            return self._resolve(self.__meta__['ordering'][key])
+        if isinstance(key, slice):
+            return [self._resolve(name) for name in self.__meta__['ordering'][key]]
         return self.__getattr__(key)
 
     def set_data(self, *args):
@@ -240,107 +677,2595 @@ class ContainerNode(Node):
     def get_data(self, *args):
         raise LookupError('Container nodes cannot handle data directly. node = %s' % self.get_absolute_url())
 
-class Reader(object):
+class LazyNode(Node):
     '''
-    Read a folder or serialized file and return a ContainerNode.
+    Placeholder for a folder or file that has not been read yet.
+
+    The parent ContainerNode swaps in the real node on first access, so
+    placeholders are never returned to the user.
     '''
-    def __init__(self, path, exclude=[], primary_keys=[]):
-        self.path = os.path.normpath(path)
-        self.name = os.path.basename(self.path)
-        self.basename, self.ext = os.path.splitext(self.name)
-        self.exclude = exclude
-        self.primary_keys = primary_keys
-        if os.path.isdir(self.path):
-            self.isdir = True
-        elif os.path.isfile(self.path):
-            self.isdir = False
-        else:
-            raise IOError('File %s not found.' % self.path)
+    __slots__ = ('__reader__',)
 
-    def _open(self):
+    def __init__(self, name, reader):
+        super(LazyNode, self).__init__(name)
+        self.__reader__ = reader
+
+    def load(self):
+        return self.__reader__.read()
+
+class ListNode(ContainerNode):
+    '''
+    A container made from a list. Besides by name and position, children
+    named by a primary key can be found by its value before slugging:
+
+        papers.get_by_key('Becker 1981')
+        papers.get_by_key(1981)
+
+    Keys that are not strings name their child as strings, and the original
+    key is kept as the verbose name of the child.
+    '''
+    __slots__ = ()
+
+    def get_by_key(self, value):
         '''
-        Open the file and return a stream.
+        Return the child whose primary key is value. Raise KeyError if there is none.
         '''
-        if not self.isdir:
-            return open(self.path, 'r')
+        name = _slug_or_none(value if isinstance(value, str) else str(value))
+        child = self._resolve(name) if name in self.__children__ else None
+        # the verbose name is the original key, so 1 and '1' do not find each other
+        if child is None or type(child.get_verbose_name()) is not type(value) or child.get_verbose_name() != value:
+            raise KeyError('%s is not a primary key. node = %s' % (value, self.get_absolute_url()))
+        return child
 
-    def _deserialize(self, stream):
+def _slug_or_none(value):
+    '''
+    Return the slug of value, or None if it cannot be the name of a node.
+    '''
+    if not isinstance(value, str):
+        return None
+    try:
+        return admissible_slug(value)
+    except NameError:
+        return None
+
+def count_nodes(node):
+    '''
+    Count the nodes that have been built at and below node. Lazy placeholders
+    count as one node and table rows are not counted.
+    '''
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, ContainerNode) and not isinstance(node, TableNode):
+            stack.extend(node.__children__.values())
+    return count
+
+def footprint(node):
+    '''
+    Estimate the bytes used by node and the nodes below it. Slugs are interned
+    and shared, so they are not counted.
+    '''
+    total = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        total += sys.getsizeof(node)
+        if isinstance(node._meta, dict):
+            total += sys.getsizeof(node._meta) + sum([sys.getsizeof(value) for value in node._meta.values()])
+        elif node._meta is not None:
+            total += sys.getsizeof(node._meta)
+        if isinstance(node, LiteralNode):
+            total += sys.getsizeof(node.__data__)
+        elif isinstance(node, ArrayNode):
+            total += sys.getsizeof(node.__array__)
+        elif isinstance(node, TableNode):
+            for column in node.__columns__:
+                total += sys.getsizeof(column)
+                if isinstance(column, list):
+                    total += sum([sys.getsizeof(value) for value in column])
+        elif isinstance(node, ContainerNode):
+            total += sys.getsizeof(node.__children__)
+            stack.extend(node.__children__.values())
+    return total
+
+class LoadStats(object):
+    '''
+    Collects timings while a tree is read: for each file, the bytes read, the
+    seconds spent parsing and building nodes and the number of nodes; for each
+    folder, the seconds spent listing it. Every record is a dictionary and is
+    passed to each hook as it is made.
+    '''
+    def __init__(self, hooks=[]):
+        self.hooks = list(hooks)
+        self.files = []
+        self.folders = []
+
+    def record_file(self, reader, node, parse_seconds, build_seconds, streamed=False):
+        record = dict(kind='file', path=reader.path, reader=reader.__class__.__name__, bytes=reader.size,
+                      parse_seconds=parse_seconds, build_seconds=build_seconds, nodes=count_nodes(node),
+                      streamed=streamed)
+        self.files.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def record_folder(self, reader, list_seconds, entries):
+        record = dict(kind='folder', path=reader.path, list_seconds=list_seconds, entries=entries)
+        self.folders.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def report(self, top=10):
         '''
-        Given a stream, deserialize to a Python object
+        Return totals, totals per reader class and the top slowest files.
         '''
-        raise NotImplementedError
+        readers = {}
+        for record in self.files:
+            totals = readers.setdefault(record['reader'], dict(files=0, bytes=0, parse_seconds=0.0,
+                                                                build_seconds=0.0, nodes=0))
+            totals['files'] += 1
+            for key in ['bytes', 'parse_seconds', 'build_seconds', 'nodes']:
+                totals[key] += record[key]
+        slowest = sorted(self.files, key=lambda record: record['parse_seconds'] + record['build_seconds'],
+                         reverse=True)[:top]
+        return dict(files=len(self.files), folders=len(self.folders),
+                    bytes=sum([record['bytes'] for record in self.files]),
+                    list_seconds=sum([record['list_seconds'] for record in self.folders]),
+                    parse_seconds=sum([record['parse_seconds'] for record in self.files]),
+                    build_seconds=sum([record['build_seconds'] for record in self.files]),
+                    nodes=sum([record['nodes'] for record in self.files]),
+                    readers=readers, slowest=slowest)
 
-    def read(self):
+class MemoryBudget(object):
+    '''
+    Keeps the nodes read from files within max_bytes, as estimated by footprint.
+
+    Each node read from a file is added when it is read, in place of the node
+    read from the same file before, and touched when it is accessed. When the
+    total is over max_bytes, the least recently used nodes are unloaded: each
+    is replaced in its folder by a LazyNode that reads the file again when it
+    is next accessed. The name and position of the file in its folder stay the
+    same. The node read last is never unloaded.
+
+    root is the root of the current version of the tree, if it is set: nodes
+    are unloaded from their folder in that version. See DataTree.reload.
+
+    callback, if given, is called with the URL of each unloaded node.
+    '''
+    def __init__(self, max_bytes, callback=None):
+        self.max_bytes = max_bytes
+        self.callback = callback
+        self.root = None
+        # path -> (node, bytes, reader), least recently used first
+        self.nodes = collections.OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.reloads = 0
+        # paths of files that have been unloaded and not read again yet
+        self.evicted = set()
+        self.lock = threading.Lock()
+        _BUDGETS.append(weakref.ref(self, _BUDGETS.remove))
+
+    def add(self, node, reader):
+        size = footprint(node)
+        with self.lock:
+            if reader.path in self.evicted:
+                self.evicted.discard(reader.path)
+                self.reloads += 1
+            if reader.path in self.nodes:
+                self.size -= self.nodes.pop(reader.path)[1]
+            self.nodes[reader.path] = (node, size, reader)
+            self.size += size
+            unloaded = []
+            while self.size > self.max_bytes and len(self.nodes) > 1:
+                (path, (old, old_size, old_reader)) = self.nodes.popitem(last=False)
+                self.size -= old_size
+                if self._unload(old, old_reader):
+                    unloaded.append(old.get_absolute_url())
+        if self.callback is not None:
+            for url in unloaded:
+                self.callback(url)
+
+    def discard(self, path):
         '''
-        Read the data and return a ContainerNode.
+        Stop counting the nodes read from path and from the files below it.
         '''
-        if not self.isdir:
-            return parse_object(self.basename, self._deserialize(self._open()), self.primary_keys)
+        below = path + os.sep
+        with self.lock:
+            for key in [key for key in self.nodes if key == path or key.startswith(below)]:
+                self.size -= self.nodes.pop(key)[1]
+            self.evicted = set([key for key in self.evicted if not (key == path or key.startswith(below))])
 
-class FolderReader(Reader):
+    def _parent(self, node):
+        '''
+        The folder of node in the current version of the tree, or None.
+        '''
+        if self.root is None:
+            return node.__parent__
+        parent = self.root
+        for name in node.get_absolute_url().split('/')[1:-1]:
+            parent = parent.__children__.get(name)
+            if parent is None or isinstance(parent, LazyNode):
+                return None
+        return parent
+
+    def _unload(self, node, reader):
+        '''
+        Replace node by a LazyNode in its folder. Return False if it is no longer in the tree.
+        '''
+        parent = self._parent(node)
+        with _RESOLVE_LOCK:
+            if parent is None or parent.__children__.get(node.__name__) is not node:
+                return False
+            stub = LazyNode(reader.basename, reader)
+            stub.__parent__ = parent
+            parent.__children__[node.__name__] = stub
+        _notify(parent, 'unload', (node,), (stub,))
+        self.evicted.add(reader.path)
+        self.evictions += 1
+        return True
+
+    def touch(self, node):
+        '''
+        Mark the file that node was read from as recently used.
+        '''
+        with self.lock:
+            while node is not None:
+                if isinstance(node._meta, dict) and 'mtime' in node._meta:
+                    entry = self.nodes.get(node._meta['path'])
+                    if entry is not None and entry[0] is node:
+                        self.nodes.move_to_end(node._meta['path'])
+                    return
+                node = node.__parent__
+
+    def stats(self):
+        return dict(max_bytes=self.max_bytes, size=self.size, resident=len(self.nodes),
+                    evictions=self.evictions, reloads=self.reloads)
+
+class RowNames(object):
     '''
-    A datatree container read from a folder.
+    The names id0, id1, ... of table rows without a primary key, without storing them.
     '''
-    def read(self):
-        root = ContainerNode(self.basename)
-        for entry in os.listdir(self.path):
-            if not any([pattern.match(entry) for pattern in self.exclude]): 
-                fullname = os.path.join(self.path, entry)
-                if os.path.isdir(fullname):
-                    child = FolderReader(fullname, self.exclude, self.primary_keys)
-                    root.add_child(child.read())
-                elif os.path.isfile(fullname):
-                    for (filetype, reader) in DISPATCHER.items():
-                        if filetype.match(fullname):
-                            child = reader(fullname, self.exclude, self.primary_keys)
-                            root.add_child(child.read())
-                            break
-        return root
+    def __init__(self, length):
+        self.length = length
 
-class YAMLReader(Reader):
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return ['id%d' % k for k in range(*position.indices(self.length))]
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError(position)
+        return 'id%d' % position
+
+    def __iter__(self):
+        return iter(['id%d' % k for k in range(self.length)])
+
+class RowNode(ContainerNode):
     '''
-    Read from a YAML file.
+    A row of a TableNode. Tables only keep weak references to their rows.
     '''
-    def _deserialize(self, stream):
-        doc = list(yaml.load_all(stream.read(), Loader=yaml.SafeLoader))
-        if len(doc)==1:
-            return doc[0]
+    __slots__ = ('__weakref__',)
+
+ROW_NAME = re.compile('^id(0|[1-9][0-9]*)$')
+
+class TableNode(ContainerNode):
+    '''
+    A container of rows stored column by column, as read from a CSV file.
+
+    Each column is a list of strings or, when its type has been inferred, an
+    array of integers, floats or booleans. Row nodes are created when they are
+    accessed and are shared for as long as they are in use.
+
+        table.get_column('price')
+        table.id0.price
+    '''
+    __slots__ = ('__header__', '__kinds__', '__columns__', '__length__', '__rows__', '__key__', '__typed__')
+
+    def __init__(self, name, header, kinds, columns, primary_keys=[], typed=False):
+        super(TableNode, self).__init__(name)
+        # cells of rows are TypedLiteralNodes
+        self.__typed__ = typed
+        self.__header__ = [admissible_slug(field) for field in header]
+        self.__kinds__ = kinds
+        self.__columns__ = columns
+        self.__length__ = len(columns[0]) if columns else 0
+        # name -> position, only when rows are named by a primary key
+        self.__rows__ = None
+        self.__key__ = None
+        if isinstance(primary_keys, str):
+            primary_keys = [primary_keys]
+        for field in primary_keys:
+            if field in header:
+                self.__key__ = header.index(field)
+                break
+        if self.__key__ is None:
+            self.__meta__['ordering'] = RowNames(self.__length__)
         else:
-            return doc
+            # keys of inferred columns are numbers, named as the strings they were read from
+            names = [admissible_slug(str(value)) for value in columns[self.__key__]]
+            self.__rows__ = {}
+            for (position, slug) in enumerate(names):
+                if slug in self.__rows__:
+                    raise NameError('Children must have unique names. node = %s' % self.get_absolute_url())
+                self.__rows__[slug] = position
+            self.__meta__['ordering'] = names
+        self.__children__ = weakref.WeakValueDictionary()
 
-# JSON is a subset of YAML
-JSONReader = YAMLReader
+    def _position(self, key):
+        if self.__rows__ is not None:
+            return self.__rows__.get(key)
+        match = ROW_NAME.match(key)
+        if match and int(match.group(1)) < self.__length__:
+            return int(match.group(1))
+        return None
 
-class CSVReader(Reader):
+    def _value(self, column, position):
+        value = self.__columns__[column][position]
+        if self.__kinds__[column] == 'bool':
+            return bool(value)
+        # NumPy scalars to int and float
+        return value.item() if hasattr(value, 'item') else value
+
+    def _resolve(self, key):
+        row = self.__children__.get(key)
+        if row is None:
+            position = self._position(key)
+            if self.__key__ is None:
+                row = RowNode('id%d' % position)
+            else:
+                row = RowNode(str(self.__columns__[self.__key__][position]))
+            def cells():
+                literal = TypedLiteralNode if self.__typed__ else LiteralNode
+                for (column, field) in enumerate(self.__header__):
+                    node = literal(field)
+                    node.set_data(self._value(column, position))
+                    yield node
+            row.add_children(cells())
+            row.__parent__ = self
+            self.__children__[key] = row
+        return row
+
+    def __bool__(self):
+        return self.__length__ > 0
+
+    def __len__(self):
+        return self.__length__
+
+    def __contains__(self, item):
+        if isinstance(item, str):
+            return self._position(item.lower()) is not None
+        elif isinstance(item, Node):
+            return item.__parent__ is self
+
+    def __iter__(self):
+        return (self._resolve(key) for key in self.__meta__['ordering'])
+
+    def __getattr__(self, name):
+        if self._position(name.lower()) is not None:
+            return self._resolve(name.lower())
+        else:
+            raise KeyError('%s is not a child node. node = %s' % (name, self.get_absolute_url()))
+
+    def add_child(self, node):
+        raise TypeError('Table nodes cannot take new children. node = %s' % self.get_absolute_url())
+
+    def add_children(self, nodes):
+        raise TypeError('Table nodes cannot take new children. node = %s' % self.get_absolute_url())
+
+    def remove_child(self, name):
+        raise TypeError('Table nodes cannot remove children. node = %s' % self.get_absolute_url())
+
+    def children_as_dictionary(self):
+        return dict([(key, self._resolve(key)) for key in self.__meta__['ordering']])
+
+    def get_dictionary(self):
+        # cells of typed tables keep their type, see _resolve
+        convert = (lambda value: value) if self.__typed__ else str
+        output = {}
+        for (position, key) in enumerate(self.__meta__['ordering']):
+            output[key] = dict([(field, convert(self._value(column, position)))
+                for (column, field) in enumerate(self.__header__)])
+        return output
+
+    def get_header(self):
+        return list(self.__header__)
+
+    def get_by_key(self, value):
+        '''
+        Return the row whose primary key is value. Raise KeyError if there is none.
+        '''
+        position = self.__rows__.get(_slug_or_none(str(value))) if self.__rows__ is not None else None
+        if position is None or self.__columns__[self.__key__][position] != value:
+            raise KeyError('%s is not a primary key. node = %s' % (value, self.get_absolute_url()))
+        return self._resolve(self.__meta__['ordering'][position])
+
+    def to_columns(self, fields=None, missing=None, infer_types=False):
+        '''
+        As ContainerNode.to_columns, but columns are taken as they are stored,
+        without creating rows. Only the fields in the header have data.
+        '''
+        if fields is None:
+            fields = self.__header__
+        output = {}
+        for field in fields:
+            slug = field.strip('/').lower()
+            if not slug in self.__header__:
+                output[field] = to_column([missing] * self.__length__, infer_types)
+                continue
+            column = self.get_column(slug)
+            if isinstance(column, list):
+                # cells of short rows are None
+                column = to_column([missing if value is None else value for value in column], infer_types)
+            else:
+                column = _numpy_column(column, self.__kinds__[self.__header__.index(slug)])
+            output[field] = column
+        return output
+
+    def get_column(self, field):
+        '''
+        Return the list or array that stores a column.
+        '''
+        return self.__columns__[self.__header__.index(admissible_slug(field))]
+
+class ItemNode(TypedLiteralNode):
     '''
-    A datatree container read from a CSV file.
+    An item of an ArrayNode. Arrays only keep weak references to their items.
     '''
-    def _deserialize(self, stream):
-        csv_reader = csv.DictReader(stream)
-        doc = []
-        for row in csv_reader:
-            doc.append(dict([(key, value) for key, value in row.items()]))
-        return doc
+    __slots__ = ('__weakref__',)
 
-DISPATCHER = {re.compile('^.+\.ya?ml$'): YAMLReader, 
-              re.compile('^.+\.csv$'): CSVReader,
-              re.compile('^.+\.json$'): JSONReader}
+class ArrayNode(ContainerNode):
+    '''
+    A list of numbers stored as one array, made by parse_object in typed mode.
 
+    Items are the children id0, id1, ..., created when they are accessed, as
+    in a TableNode without a primary key. The array can also be indexed and
+    sliced directly, and aggregated without creating nodes:
 
-class DataTree(object):
-    def __init__(self, root, exclude=[], primary_keys=[]):
-        xexclude = []
-        for pattern in exclude:
-            xexclude.append(re.compile(pattern))
-        reader = FolderReader(root, xexclude, primary_keys)
-        self.root = reader.read()
+        prices[0]
+        prices[10:20]
+        prices.sum(), prices.mean(), prices.min(), prices.max()
 
-    def get_by_url(self, url):
-        url = os.path.normpath(url)
-        parts = url.split('/')
-        parts = [part for part in parts if not part=='']
-        def lookup(node, child):
-            return node[child]
-        return reduce(lookup, [self.root]+parts)
+    The array is a NumPy array if NumPy is installed, and an array.array otherwise.
+    '''
+    __slots__ = ('__array__',)
+
+    def __init__(self, name, values):
+        super(ArrayNode, self).__init__(name)
+        self.__array__ = values
+        self.__meta__['ordering'] = RowNames(len(values))
+        self.__children__ = weakref.WeakValueDictionary()
+
+    def _position(self, key):
+        match = ROW_NAME.match(key)
+        if match and int(match.group(1)) < len(self.__array__):
+            return int(match.group(1))
+        return None
+
+    def _value(self, position):
+        value = self.__array__[position]
+        # NumPy scalars to int and float
+        return value.item() if hasattr(value, 'item') else value
+
+    def _resolve(self, key):
+        item = self.__children__.get(key)
+        if item is None:
+            item = ItemNode(key)
+            item.__data__ = self._value(self._position(key))
+            item.__parent__ = self
+            self.__children__[key] = item
+        return item
+
+    def __bool__(self):
+        return len(self.__array__) > 0
+
+    def __len__(self):
+        return len(self.__array__)
+
+    def __contains__(self, item):
+        if isinstance(item, str):
+            return self._position(item.lower()) is not None
+        elif isinstance(item, Node):
+            return item.__parent__ is self
+
+    def __iter__(self):
+        return (self._resolve(key) for key in self.__meta__['ordering'])
+
+    def __getattr__(self, name):
+        if self._position(name.lower()) is not None:
+            return self._resolve(name.lower())
+        else:
+            raise KeyError('%s is not a child node. node = %s' % (name, self.get_absolute_url()))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.__array__[key]
+        if isinstance(key, int):
+            return self._value(key)
+        return self.__getattr__(key)
+
+    def add_child(self, node):
+        raise TypeError('Array nodes cannot take new children. node = %s' % self.get_absolute_url())
+
+    def add_children(self, nodes):
+        raise TypeError('Array nodes cannot take new children. node = %s' % self.get_absolute_url())
+
+    def remove_child(self, name):
+        raise TypeError('Array nodes cannot remove children. node = %s' % self.get_absolute_url())
+
+    def children_as_dictionary(self):
+        return dict([(key, self._resolve(key)) for key in self.__meta__['ordering']])
+
+    def get_dictionary(self):
+        return dict([('id%d' % position, value) for (position, value) in enumerate(self.get_list())])
+
+    def get_array(self):
+        return self.__array__
+
+    def get_list(self):
+        return self.__array__.tolist()
+
+    def sum(self):
+        if numpy is not None and isinstance(self.__array__, numpy.ndarray):
+            return self.__array__.sum().item()
+        return sum(self.__array__)
+
+    def mean(self):
+        if numpy is not None and isinstance(self.__array__, numpy.ndarray):
+            return self.__array__.mean().item()
+        return sum(self.__array__) / len(self.__array__)
+
+    def min(self):
+        if numpy is not None and isinstance(self.__array__, numpy.ndarray):
+            return self.__array__.min().item()
+        return min(self.__array__)
+
+    def max(self):
+        if numpy is not None and isinstance(self.__array__, numpy.ndarray):
+            return self.__array__.max().item()
+        return max(self.__array__)
+
+class ParseCache(object):
+    '''
+    Stores the deserialized Python object of each source file in a cache directory.
+
+    An entry is valid while the modification time and size of the file (and,
+    with hash_contents=True, the SHA-1 of its contents) are unchanged. When
+    max_bytes is given, the least recently used entries are evicted once the
+    cache grows beyond it.
+
+        cache = ParseCache('.datatree-cache', max_bytes=2**30)
+        tree = DataTree('papers', cache=cache)
+        print cache.stats()
+    '''
+    def __init__(self, directory, max_bytes=None, hash_contents=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.size = sum([size for (mtime, size, entry) in self._entries()])
+
+    def _entry(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                entry = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(entry)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        return entries
+
+    def signature(self, path):
+        '''
+        Return the key that an entry for path must match to be valid.
+        '''
+        stat = os.stat(path)
+        if self.hash_contents:
+            stream = open(path, 'rb')
+            try:
+                digest = hashlib.sha1(stream.read()).hexdigest()
+            finally:
+                stream.close()
+            return (stat.st_mtime_ns, stat.st_size, digest)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path, signature):
+        '''
+        Return the cached object for path. Raise KeyError if there is no valid entry.
+        '''
+        entry = self._entry(path)
+        try:
+            stream = open(entry, 'rb')
+        except IOError:
+            self.misses += 1
+            raise KeyError(path)
+        try:
+            blob = stream.read()
+        finally:
+            stream.close()
+        try:
+            (stored, obj) = pickle.loads(blob)
+        except Exception:
+            stored = None
+        if stored != signature:
+            self.misses += 1
+            raise KeyError(path)
+        self.hits += 1
+        self.bytes_read += len(blob)
+        # mark as recently used for eviction
+        os.utime(entry, None)
+        return obj
+
+    def put(self, path, signature, obj):
+        '''
+        Store obj as the deserialized contents of path.
+        '''
+        entry = self._entry(path)
+        blob = pickle.dumps((signature, obj), pickle.HIGHEST_PROTOCOL)
+        try:
+            self.size -= os.path.getsize(entry)
+        except OSError:
+            pass
+        temporary = '%s.%d.tmp' % (entry, os.getpid())
+        stream = open(temporary, 'wb')
+        try:
+            stream.write(blob)
+        finally:
+            stream.close()
+        os.replace(temporary, entry)
+        self.bytes_written += len(blob)
+        self.size += len(blob)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+        Remove least recently used entries until the cache fits in max_bytes.
+        '''
+        entries = sorted(self._entries())
+        self.size = sum([size for (mtime, size, entry) in entries])
+        for (mtime, size, entry) in entries:
+            if self.max_bytes is None or self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                continue
+            self.size -= size
+            self.evictions += 1
+
+    def clear(self):
+        for (mtime, size, entry) in self._entries():
+            os.remove(entry)
+        self.size = 0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, bytes_read=self.bytes_read,
+                    bytes_written=self.bytes_written, evictions=self.evictions, size=self.size)
+
+class Reader(object):
+    '''
+    Read a folder or serialized file and return a ContainerNode.
+    '''
+    # placeholders of fresh readers read the file as it is when they are accessed
+    fresh = True
+
+    def __init__(self, path, exclude=[], primary_keys=[], *, lazy=False, workers=0, cache=None, streaming=False,
+                 columnar=False, infer_types=False, stats=None, typed=False, selector=None, breadth_first=False,
+                 budget=None, entry=None):
+        self.path = os.path.normpath(path)
+        self.name = os.path.basename(self.path)
+        self.basename, self.ext = os.path.splitext(self.name)
+        self.exclude = exclude
+        self.primary_keys = primary_keys
+        self.lazy = lazy
+        self.workers = workers
+        self.cache = cache
+        self.streaming = streaming
+        self.columnar = columnar
+        self.infer_types = infer_types
+        self.stats = stats
+        self.typed = typed
+        # PathSelector of the tree; folder readers make one from exclude if None
+        self.selector = selector
+        self.breadth_first = breadth_first
+        self.budget = budget
+        if entry is not None and entry.is_dir():
+            # the type of a directory entry is known without a stat, and folders
+            # are compared with disk entry by entry, so they need no mtime
+            self.isdir = True
+            self.mtime = None
+            self.size = None
+            return
+        try:
+            # a directory entry stats at most once
+            info = os.stat(self.path) if entry is None else entry.stat()
+        except OSError:
+            raise IOError('File %s not found.' % self.path)
+        if stat.S_ISDIR(info.st_mode):
+            self.isdir = True
+        elif stat.S_ISREG(info.st_mode):
+            self.isdir = False
+        else:
+            raise IOError('File %s not found.' % self.path)
+        # recorded before reading, so that DataTree.refresh errs on the side of re-reading
+        self.mtime = info.st_mtime_ns
+        self.size = info.st_size
+
+    def __getstate__(self):
+        # readers are sent to worker processes, which do not record timings or track memory
+        state = self.__dict__.copy()
+        state['stats'] = None
+        state['budget'] = None
+        return state
+
+    def _open(self):
+        '''
+        Open the file and return a stream.
+        '''
+        if not self.isdir:
+            return open(self.path, 'r')
+
+    def _deserialize(self, stream):
+        '''
+        Given a stream, deserialize to a Python object
+        '''
+        raise NotImplementedError
+
+    def _reader(self, cls, path, entry=None):
+        '''
+        Return a reader of class cls for path, with the same options as this one.
+        entry is the os.DirEntry of path, if it was found by os.scandir.
+        '''
+        return cls(path, entry=entry, **self._options())
+
+    def _options(self):
+        '''
+        Keyword arguments that make a reader with the same options as this one.
+        '''
+        return dict(exclude=self.exclude, primary_keys=self.primary_keys, lazy=self.lazy, workers=self.workers,
+                    cache=self.cache, streaming=self.streaming, columnar=self.columnar, infer_types=self.infer_types,
+                    stats=self.stats, typed=self.typed, selector=self.selector, breadth_first=self.breadth_first,
+                    budget=self.budget)
+
+    def _parse(self):
+        '''
+        Read the file and return the deserialized Python object.
+        '''
+        stream = self._open()
+        try:
+            return self._deserialize(stream)
+        finally:
+            stream.close()
+
+    def _signature(self):
+        '''
+        Key of the cache entry for this file.
+        '''
+        return self.cache.signature(self.path)
+
+    def _load(self):
+        '''
+        Return the deserialized Python object, from the cache if possible.
+        '''
+        if self.cache is None:
+            return self._parse()
+        signature = self._signature()
+        try:
+            return self.cache.get(self.path, signature)
+        except KeyError:
+            obj = self._parse()
+            self.cache.put(self.path, signature, obj)
+            return obj
+
+    def _node(self, obj):
+        '''
+        Turn the deserialized Python object into a node.
+        '''
+        node = parse_object(self.basename, obj, self.primary_keys, self.typed)
+        node.set_metadata(path=self.path, mtime=self.mtime, size=self.size)
+        return node
+
+    def is_current(self, node):
+        '''
+        Check whether node was read from this file and the file has not changed since.
+        '''
+        if isinstance(node, LazyNode):
+            reader = node.__reader__
+            if reader.path != self.path or reader.isdir != self.isdir:
+                return False
+            return self.isdir or (reader.mtime == self.mtime and reader.size == self.size)
+        meta = node.__meta__
+        if meta.get('path') != self.path:
+            return False
+        if self.isdir:
+            # folders are checked entry by entry
+            return 'mtime' not in meta
+        return meta.get('mtime') == self.mtime and meta.get('size') == self.size
+
+    def _finish(self, obj, parse_seconds):
+        '''
+        Turn the deserialized object into a node, recording timings if instrumented.
+        '''
+        if self.stats is None:
+            return self._track(self._node(obj))
+        start = time.perf_counter()
+        node = self._node(obj)
+        self.stats.record_file(self, node, parse_seconds, time.perf_counter() - start)
+        return self._track(node)
+
+    def _track(self, node):
+        '''
+        Count the node read from this file against the memory budget, if any.
+        '''
+        if self.budget is not None:
+            self.budget.add(node, self)
+        return node
+
+    def read(self):
+        '''
+        Read the data and return a ContainerNode.
+        '''
+        if not self.isdir:
+            if self.stats is None and self.budget is None:
+                return self._node(self._load())
+            start = time.perf_counter()
+            obj = self._load()
+            return self._finish(obj, time.perf_counter() - start)
+
+def _deserialize_text(reader, text):
+    '''
+    Deserialize text that has already been read. Runs in a worker process.
+    Returns the object and the seconds it took.
+    '''
+    start = time.perf_counter()
+    stream = io.StringIO(text)
+    # parsers name the stream in their errors, as they do for the file itself
+    stream.name = reader.path
+    obj = reader._deserialize(stream)
+    return (obj, time.perf_counter() - start)
+
+def _read_text(reader):
+    stream = reader._open()
+    try:
+        return stream.read()
+    finally:
+        stream.close()
+
+# folders listed at once by a breadth first walk
+LISTING_THREADS = 8
+
+class PathSelector(object):
+    '''
+    Decides which entries below a root folder are read, from their names and
+    paths alone, so that entries that are left out are never stat-ed or opened.
+
+    exclude is a list of regular expressions, compiled or not, matched against
+    the name of each entry. include is a list of patterns, as for glob, matched
+    against the path of each entry relative to the root, such as
+    /papers/published/** or /papers/*/paper1.yaml. An entry is read if it or a
+    folder above it matches an include pattern; folders that may have matching
+    entries below them are listed too. Without include, everything that is not
+    excluded is read.
+
+    Include patterns are combined into one regular expression. Exclude
+    patterns are matched one by one, so that each keeps its own flags and
+    groups.
+    '''
+    def __init__(self, root, exclude=[], include=[]):
+        self.root = os.path.normpath(root)
+        self.include = include
+        self.exclude = [re.compile(pattern) for pattern in exclude]
+        self.selected = None
+        self.below = None
+        if include:
+            self.selected = re.compile('^(?:%s)(?:/.*)?$' % '|'.join([_glob(pattern) for pattern in include]))
+            prefixes = []
+            for pattern in include:
+                parts = [part for part in pattern.split('/') if part]
+                prefixes.extend([_glob('/'.join(parts[:k])) for k in range(1, len(parts))])
+            if prefixes:
+                self.below = re.compile('^(?:%s)$' % '|'.join(prefixes))
+
+    def url(self, path):
+        '''
+        Path of a folder or file relative to the root, with / as separator.
+        '''
+        return path[len(self.root):].replace(os.sep, '/')
+
+    def admits(self, url, name):
+        '''
+        Check whether the entry called name at url may be read, before knowing
+        whether it is a folder or a file.
+        '''
+        for pattern in self.exclude:
+            if pattern.match(name):
+                return False
+        if self.selected is None or self.selected.match(url):
+            return True
+        return self.below is not None and self.below.match(url) is not None
+
+    def selects(self, url):
+        '''
+        Check whether the file at url is read.
+        '''
+        return self.selected is None or self.selected.match(url) is not None
+
+class FolderReader(Reader):
+    '''
+    A datatree container read from a folder.
+
+    With lazy=True, subfolders and files are added as LazyNode placeholders
+    and only read when first accessed.
+
+    With workers > 1, files are read by a pool of threads and deserialized by a
+    pool of worker processes. The tree is then assembled in the same order as
+    the serial reader, so ordering and errors are the same.
+
+    With breadth_first=True, all folders are listed before any file is read,
+    level by level and several folders at a time.
+    '''
+    def _children(self):
+        '''
+        Return a reader for each folder and data file in this folder.
+
+        Entries are listed with os.scandir, whose file types need no stat on
+        most systems, and are checked against the selector before anything
+        else. Only data files are stat-ed, once.
+        '''
+        if self.selector is None:
+            self.selector = PathSelector(self.path, self.exclude)
+        selector = self.selector
+        base = selector.url(self.path)
+        readers = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                url = base + '/' + entry.name
+                if not selector.admits(url, entry.name):
+                    continue
+                if entry.is_dir():
+                    readers.append(self._reader(FolderReader, entry.path, entry))
+                    continue
+                reader = reader_for(entry.path)
+                if reader is not None and selector.selects(url) and entry.is_file():
+                    readers.append(self._reader(reader, entry.path, entry))
+        return readers
+
+    def _list(self):
+        '''
+        Return the child readers, recording the time it took if instrumented.
+        '''
+        if self.stats is None:
+            return self._children()
+        start = time.perf_counter()
+        readers = self._children()
+        self.stats.record_folder(self, time.perf_counter() - start, len(readers))
+        return readers
+
+    def _plan(self):
+        '''
+        Return the readers below this folder as nested (reader, children) pairs.
+        '''
+        if self.breadth_first:
+            return self._plan_breadth_first()
+        return [(child, child._plan() if child.isdir else None) for child in self._list()]
+
+    def _plan_breadth_first(self):
+        '''
+        As _plan, but folders are listed one level at a time, LISTING_THREADS
+        at once, which hides the latency of network filesystems.
+        '''
+        plan = []
+        level = [(self, plan)]
+        pool = ThreadPoolExecutor(LISTING_THREADS)
+        try:
+            while level:
+                listings = pool.map(lambda item: item[0]._list(), level)
+                below = []
+                for ((folder, children), readers) in zip(level, listings):
+                    for child in readers:
+                        grandchildren = [] if child.isdir else None
+                        children.append((child, grandchildren))
+                        if child.isdir:
+                            below.append((child, grandchildren))
+                level = below
+        finally:
+            pool.shutdown()
+        return plan
+
+    def _assemble(self, plan, results=None):
+        '''
+        Build the folder node from a plan, taking file contents from results,
+        or reading the files if results is None.
+        '''
+        def build(child, grandchildren):
+            if child.isdir:
+                return child._assemble(grandchildren, results)
+            if results is None:
+                return child.read()
+            return child._finish(*results[child.path].result())
+        root = ContainerNode(self.basename)
+        root.set_metadata(path=self.path)
+        root.add_children(build(child, grandchildren) for (child, grandchildren) in plan)
+        return root
+
+    def _read_parallel(self):
+        plan = self._plan()
+        files = []
+        stack = list(plan)
+        while stack:
+            (child, grandchildren) = stack.pop()
+            if child.isdir:
+                stack.extend(grandchildren)
+            else:
+                files.append(child)
+        results = {}
+        signatures = {}
+        if self.cache is not None:
+            misses = []
+            for child in files:
+                signatures[child.path] = child._signature()
+                try:
+                    obj = self.cache.get(child.path, signatures[child.path])
+                except KeyError:
+                    misses.append(child)
+                    continue
+                results[child.path] = Future()
+                results[child.path].set_result((obj, 0.0))
+            files = misses
+        io_pool = ThreadPoolExecutor(self.workers)
+        parse_pool = ProcessPoolExecutor(self.workers)
+        try:
+            texts = dict([(io_pool.submit(_read_text, child), child) for child in files])
+            for future in as_completed(texts):
+                child = texts[future]
+                if future.exception() is None:
+                    results[child.path] = parse_pool.submit(_deserialize_text, child, future.result())
+                else:
+                    # raised in order while assembling
+                    results[child.path] = future
+            root = self._assemble(plan, results)
+            for child in files:
+                if self.cache is not None:
+                    self.cache.put(child.path, signatures[child.path], results[child.path].result()[0])
+            return root
+        finally:
+            io_pool.shutdown(cancel_futures=True)
+            parse_pool.shutdown(cancel_futures=True)
+
+    def read(self):
+        if self.workers > 1 and not self.lazy:
+            return self._read_parallel()
+        if self.breadth_first and not self.lazy:
+            return self._assemble(self._plan())
+        root = ContainerNode(self.basename)
+        root.set_metadata(path=self.path)
+        if self.lazy:
+            root.add_children(LazyNode(child.basename, child) for child in self._list())
+        else:
+            root.add_children(child.read() for child in self._list())
+        return root
+
+# deserializer backends: functions that take a stream and return a list of documents
+BACKENDS = {}
+
+def register_backend(name, load_all):
+    '''
+    Register a deserializer backend. Readers use the first backend in their
+    backends list that is registered.
+    '''
+    BACKENDS[name] = load_all
+
+def _pyyaml_load_all(stream):
+    return yaml.load_all(stream, Loader=yaml.SafeLoader)
+
+def _libyaml_load_all(stream):
+    return yaml.load_all(stream, Loader=yaml.CSafeLoader)
+
+def _json_load_all(stream):
+    text = stream.read()
+    if not text.strip():
+        # an empty file is an empty YAML stream
+        return []
+    return [json.loads(text)]
+
+register_backend('pyyaml', _pyyaml_load_all)
+register_backend('json', _json_load_all)
+if hasattr(yaml, 'CSafeLoader'):
+    register_backend('libyaml', _libyaml_load_all)
+
+try:
+    import orjson
+    def _orjson_load_all(stream):
+        text = stream.read()
+        if not text.strip():
+            return []
+        return [orjson.loads(text)]
+    register_backend('orjson', _orjson_load_all)
+except ImportError:
+    pass
+
+class YAMLReader(Reader):
+    '''
+    Read from a YAML file.
+
+    With streaming=True, a multi-document file is read one document at a time
+    and each document is turned into a node before the next one is parsed.
+    Files read through a ParseCache or in parallel are not streamed, as those
+    need the whole deserialized object.
+    '''
+    backends = ['libyaml', 'pyyaml']
+
+    def _documents(self, stream):
+        '''
+        Return the documents in the stream, using the first available backend.
+        '''
+        for name in self.backends:
+            if name in BACKENDS:
+                return BACKENDS[name](stream)
+        raise LookupError('No deserializer backend available. backends = %s' % self.backends)
+
+    def _deserialize(self, stream):
+        doc = list(self._documents(stream))
+        if len(doc)==1:
+            return doc[0]
+        else:
+            return doc
+
+    def _read_streaming(self):
+        stream = self._open()
+        try:
+            documents = iter(self._documents(stream))
+            head = []
+            for doc in documents:
+                head.append(doc)
+                if len(head) == 2:
+                    break
+            if len(head) < 2:
+                return self._node(head[0] if head else [])
+            root = ListNode(self.basename)
+            root.add_children(parse_object(item_name(position, doc, self.primary_keys), doc, self.primary_keys, self.typed)
+                              for (position, doc) in enumerate(chain(head, documents)))
+            root.set_metadata(path=self.path, mtime=self.mtime, size=self.size)
+            return root
+        finally:
+            stream.close()
+
+    def read(self):
+        if self.streaming and self.cache is None:
+            if self.stats is None:
+                return self._track(self._read_streaming())
+            start = time.perf_counter()
+            node = self._read_streaming()
+            # parsing and building are interleaved, so all of it counts as parsing
+            self.stats.record_file(self, node, time.perf_counter() - start, 0.0, streamed=True)
+            return self._track(node)
+        return super(YAMLReader, self).read()
+
+class JSONReader(YAMLReader):
+    '''
+    Read from a JSON file. JSON is a subset of YAML, so the YAML backends
+    are used if no JSON parser is available.
+    '''
+    backends = ['orjson', 'json', 'libyaml', 'pyyaml']
+
+def infer_column(values):
+    '''
+    Return the kind of a column of strings and the values in the most compact storage.
+    '''
+    try:
+        return ('int', array('q', [int(value) for value in values]))
+    except (ValueError, TypeError, OverflowError):
+        pass
+    try:
+        return ('float', array('d', [float(value) for value in values]))
+    except (ValueError, TypeError):
+        pass
+    try:
+        return ('bool', array('b', [BOOLEANS[value] for value in values]))
+    except KeyError:
+        pass
+    return ('str', values)
+
+# array typecodes of the columns of each kind, see infer_column
+TYPECODES = {'int': 'q', 'float': 'd', 'bool': 'b'}
+
+BOOLEANS = {'true': 1, 'True': 1, 'TRUE': 1, 'false': 0, 'False': 0, 'FALSE': 0}
+
+def to_column(values, infer_types=False):
+    '''
+    Store a list of values as a column: a NumPy array, or an array.array if
+    NumPy is not installed, for integers, floats and booleans, and the list
+    itself otherwise. With infer_types=True, columns of strings are converted
+    as in CSVReader.
+    '''
+    if infer_types and all([isinstance(value, str) or (isinstance(value, float) and value != value) for value in values]):
+        # strings, and NaN for missing values
+        (kind, column) = infer_column(values)
+    elif values and all([value is True or value is False for value in values]):
+        (kind, column) = ('bool', array('b', values))
+    else:
+        (kind, column) = ('number', numeric_array(values))
+    if kind == 'str' or column is None:
+        return values
+    return _numpy_column(column, kind)
+
+def _numpy_column(column, kind):
+    '''
+    Turn an array.array column of the given kind into a NumPy array, if NumPy is installed.
+    '''
+    if numpy is None or not isinstance(column, array):
+        return column
+    # shares memory with the array.array
+    output = numpy.frombuffer(column, dtype=column.typecode)
+    return output.astype(bool) if kind == 'bool' else output
+
+class CSVReader(Reader):
+    '''
+    A datatree container read from a CSV file.
+
+    With columnar=True, the file is read into a TableNode that stores one list
+    per column instead of a node per cell. With infer_types=True as well,
+    columns of integers, floats and booleans are stored as arrays.
+    '''
+    def _signature(self):
+        signature = super(CSVReader, self)._signature()
+        if self.columnar:
+            return signature + (('columnar', self.infer_types),)
+        return signature
+
+    def _deserialize(self, stream):
+        if self.columnar:
+            return self._deserialize_columns(stream)
+        csv_reader = csv.DictReader(stream)
+        doc = []
+        for row in csv_reader:
+            doc.append(dict([(key, value) for key, value in row.items()]))
+        return doc
+
+    def _deserialize_columns(self, stream):
+        '''
+        Return the header, the kind of each column and the columns.
+        '''
+        csv_reader = csv.reader(stream)
+        header = next(csv_reader, [])
+        columns = [[] for field in header]
+        width = len(header)
+        for row in csv_reader:
+            if not row:
+                # csv.DictReader skips blank lines
+                continue
+            if len(row) > width:
+                raise NameError('Row has more fields than the header. file = %s' % self.path)
+            row.extend([None] * (width - len(row)))
+            for (column, value) in zip(columns, row):
+                column.append(value)
+        kinds = ['str'] * width
+        if self.infer_types:
+            for position in range(width):
+                (kinds[position], columns[position]) = infer_column(columns[position])
+        return (header, kinds, columns)
+
+    def _node(self, obj):
+        if not self.columnar:
+            return super(CSVReader, self)._node(obj)
+        (header, kinds, columns) = obj
+        node = TableNode(self.basename, header, kinds, columns, self.primary_keys, self.typed)
+        node.set_metadata(path=self.path, mtime=self.mtime, size=self.size)
+        return node
+
+# reader of each file extension
+EXTENSIONS = {'.yaml': YAMLReader, '.yml': YAMLReader, '.csv': CSVReader, '.json': JSONReader}
+CSV_FILE = re.compile(r'^.+\.csv$')
+JSON_FILE = re.compile(r'^.+\.json$')
+# readers of file paths that match regular expressions, tried in turn before EXTENSIONS
+DISPATCHER = {YAML_FILE: YAMLReader,
+              CSV_FILE: CSVReader,
+              JSON_FILE: JSONReader}
+# the built-in entries of DISPATCHER are answered from EXTENSIONS, without matching
+BUILTIN_DISPATCHER = dict(DISPATCHER)
+BUILTIN_EXTENSIONS = {'.yaml': YAML_FILE, '.yml': YAML_FILE, '.csv': CSV_FILE, '.json': JSON_FILE}
+EXTENSION = re.compile('^\.\w+$')
+
+def register_reader(pattern, reader):
+    '''
+    Read files with reader. pattern is either an extension, such as '.toml',
+    or a regular expression that is matched against the path of the file.
+    Regular expressions take precedence over extensions.
+    '''
+    if EXTENSION.match(pattern):
+        EXTENSIONS[pattern] = reader
+    else:
+        DISPATCHER[re.compile(pattern)] = reader
+
+def reader_for(path):
+    '''
+    Return the reader class for a file, or None if it is not a data file.
+
+    Regular expressions in DISPATCHER are tried first, in order, then the
+    extension of the file is looked up in EXTENSIONS. A built-in extension
+    is not read if its entry has been removed from DISPATCHER.
+    '''
+    for (filetype, reader) in DISPATCHER.items():
+        if BUILTIN_DISPATCHER.get(filetype) is not reader and filetype.match(path):
+            return reader
+    extension = os.path.splitext(path)[1]
+    builtin = BUILTIN_EXTENSIONS.get(extension)
+    if builtin is not None and not builtin in DISPATCHER:
+        return None
+    return EXTENSIONS.get(extension)
+
+
+def _glob(pattern):
+    regex = ''
+    for part in [part for part in pattern.split('/') if part]:
+        if part == '**':
+            regex += '(?:/[^/]+)*'
+        else:
+            regex += '/' + ''.join(['[^/]*' if c == '*' else '[^/]' if c == '?' else re.escape(c) for c in part])
+    return regex
+
+def glob_regex(pattern):
+    '''
+    Compile a URL pattern where * matches within one part of the URL, ? matches
+    one character and ** matches any number of parts.
+    '''
+    return re.compile('^%s$' % _glob(pattern))
+
+class UrlIndex(object):
+    '''
+    Flat index from URL to node.
+
+    Lookups fill the index as they go and are checked against the cached URL
+    of the node, so nodes that were moved or removed are never returned.
+    Entries are dropped as soon as their nodes are removed, and table rows,
+    their cells and array items, which their containers only hold weakly,
+    are never kept.
+    Prefix and glob queries need the sorted URLs of every loaded node. These
+    are listed on first use and from then on kept up to date as nodes below
+    the root are added, removed, loaded and unloaded; changes in other trees
+    are ignored. Placeholders of lazy trees, the rows of TableNodes and the
+    items of ArrayNodes are not indexed.
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.nodes = {}
+        # sorted URLs of all loaded nodes, None until first used
+        self.urls = None
+        self.lock = threading.Lock()
+        _observe(self, root)
+
+    def lookup(self, url):
+        '''
+        Return the node at url, or None if it is not in the index.
+        '''
+        node = self.nodes.get(url)
+        if node is not None and node.get_absolute_url() == url:
+            return node
+        return None
+
+    def add(self, node):
+        if isinstance(node, (RowNode, ItemNode)) or isinstance(node.__parent__, RowNode):
+            return
+        self.nodes[node.get_absolute_url()] = node
+
+    def discard(self, url):
+        '''
+        Forget the nodes at and below url.
+        '''
+        below = url.rstrip('/') + '/'
+        with self.lock:
+            for key in [key for key in self.nodes if key == url or key.startswith(below)]:
+                del self.nodes[key]
+            if self.urls is not None:
+                (first, last) = self._range(url)
+                del self.urls[first:last]
+
+    def _entries(self, node):
+        '''
+        Return the URL and node of node and of each loaded node below it.
+        '''
+        entries = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            entries.append((node.get_absolute_url(), node))
+            if isinstance(node, ContainerNode) and not isinstance(node, (TableNode, ArrayNode)):
+                stack.extend([child for child in node.__children__.values() if not isinstance(child, LazyNode)])
+        return entries
+
+    def _range(self, url):
+        '''
+        Return the first and last position in urls of the node at url and its descendants.
+        '''
+        if url == '/':
+            return (0, len(self.urls))
+        # slugs only contain word characters, and '0' is the first of them after '/'
+        return (bisect_left(self.urls, url), bisect_left(self.urls, url + '0'))
+
+    def rebuild(self):
+        '''
+        List the URLs of all loaded nodes, and keep them up to date from then on.
+        '''
+        with self.lock:
+            self.nodes = dict(self._entries(self.root))
+            self.urls = sorted(self.nodes)
+
+    def _node_changed(self, names, container, event, old, new):
+        if event == 'data' or _names_below(self.root, names, container) is None:
+            return
+        base = ''.join(['/' + name for name in names])
+        with self.lock:
+            if self.urls is None:
+                # only looked up nodes are kept until the URLs are listed
+                if old and self.nodes:
+                    removed = set([base + '/' + node.__name__ for node in old])
+                    for key in [key for key in self.nodes if _at_or_below(key, removed)]:
+                        del self.nodes[key]
+                return
+            for node in old:
+                (first, last) = self._range(base + '/' + node.__name__)
+                for url in self.urls[first:last]:
+                    self.nodes.pop(url, None)
+                del self.urls[first:last]
+            for node in new:
+                if isinstance(node, LazyNode):
+                    continue
+                entries = self._entries(node)
+                self.nodes.update(entries)
+                # the URLs below a node are next to each other
+                (first, last) = self._range(entries[0][0])
+                self.urls[first:last] = sorted([url for (url, node) in entries])
+
+    def _below(self, url):
+        '''
+        Return the URL and node of the node at url and its descendants, in URL order.
+        '''
+        if self.urls is None:
+            self.rebuild()
+        with self.lock:
+            (first, last) = self._range(url.rstrip('/') or '/')
+            return [(key, self.nodes[key]) for key in self.urls[first:last]]
+
+    def prefix(self, url):
+        '''
+        Return the node at url and all nodes below it, in URL order.
+        '''
+        return [node for (key, node) in self._below(url)]
+
+    def glob(self, pattern):
+        '''
+        Return the nodes whose URL matches pattern, in URL order.
+        '''
+        fixed = []
+        for part in [part for part in pattern.split('/') if part]:
+            if '*' in part or '?' in part:
+                break
+            fixed.append(part)
+        regex = glob_regex(pattern)
+        return [node for (key, node) in self._below('/' + '/'.join(fixed))
+                if regex.match('' if key == '/' else key)]
+
+def _at_or_below(url, urls):
+    '''
+    Check whether url or a URL above it is in the set urls.
+    '''
+    while url:
+        if url in urls:
+            return True
+        url = url[:url.rfind('/')]
+    return False
+
+class _Writer(object):
+    '''
+    Buffers small pieces of text and writes them to a stream in larger chunks.
+    '''
+    def __init__(self, stream, size=4096):
+        self.stream = stream
+        self.size = size
+        self.pieces = []
+
+    def write(self, text):
+        self.pieces.append(text)
+        if len(self.pieces) >= self.size:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(''.join(self.pieces))
+        self.pieces = []
+
+def _expanded(node, level, depth):
+    return isinstance(node, ContainerNode) and (depth is None or level < depth)
+
+def export_json(node, stream, depth=None):
+    '''
+    Write node and the nodes below it to stream as JSON, following the ordering
+    of each container. The tree is walked without recursion and written as it
+    is walked, so no copy of it is built in memory.
+
+    With depth, only that many levels of containers are written out; deeper
+    containers are written as their URL.
+    '''
+    writer = _Writer(stream)
+    stack = []
+    def begin(node, level):
+        if _expanded(node, level, depth):
+            writer.write('{')
+            stack.append([iter(node), level, True])
+        elif isinstance(node, ContainerNode):
+            writer.write(json.dumps(node.get_absolute_url()))
+        else:
+            writer.write(json.dumps(node.get_data(), default=str))
+    begin(node, 0)
+    while stack:
+        frame = stack[-1]
+        child = next(frame[0], None)
+        if child is None:
+            writer.write('}')
+            stack.pop()
+            continue
+        if frame[2]:
+            frame[2] = False
+        else:
+            writer.write(', ')
+        writer.write(json.dumps(child.__name__) + ': ')
+        begin(child, frame[1] + 1)
+    writer.flush()
+
+def export_yaml(node, stream, depth=None):
+    '''
+    Write node and the nodes below it to stream as block style YAML, in the
+    same way as export_json.
+    '''
+    writer = _Writer(stream)
+    def scalar(node):
+        if isinstance(node, ContainerNode):
+            return json.dumps(node.get_absolute_url())
+        return json.dumps(node.get_data(), default=str)
+    if not _expanded(node, 0, depth):
+        writer.write(scalar(node) + '\n')
+    elif not node:
+        writer.write('{}\n')
+    stack = [(iter(node), 0)] if _expanded(node, 0, depth) else []
+    while stack:
+        (children, level) = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+        writer.write('  ' * level + json.dumps(child.__name__) + ':')
+        if not _expanded(child, level + 1, depth):
+            writer.write(' ' + scalar(child) + '\n')
+        elif not child:
+            writer.write(' {}\n')
+        else:
+            writer.write('\n')
+            stack.append((iter(child), level + 1))
+    writer.flush()
+
+SNAPSHOT_MAGIC = b'DTSNAP01'
+SNAPSHOT_CONTAINER = 0
+SNAPSHOT_LITERAL = 1
+SNAPSHOT_TYPED = 2
+SNAPSHOT_ARRAY = 3
+SNAPSHOT_LIST = 4
+SNAPSHOT_TABLE = 5
+
+def save_snapshot(node, path, options=None):
+    '''
+    Write node and the nodes below it to a snapshot file at path.
+
+    Nodes are numbered breadth first, so that the children of each container
+    are consecutive. The file holds, in native byte order,
+
+        magic, byte order mark, number of nodes, number of strings
+        parent, name, kind, data, first child, child count and meta of each node
+        offsets of strings in the string table
+        string table, UTF-8
+
+    where name, data and meta are string ids, and data and meta are -1 when
+    missing. Meta is stored as JSON without the ordering, which is the order
+    of the children. options, a dict of reader options, is stored in the meta
+    of node under 'reader'. Lazy placeholders are loaded. Tables are stored
+    column by column, with their header and kinds, and their rows are not
+    written as nodes. The data of typed literals, arrays and tables is stored
+    as JSON, so dates come back as strings.
+    '''
+    strings = {}
+    def string_id(text):
+        if not text in strings:
+            strings[text] = len(strings)
+        return strings[text]
+    columns = [array('q') for k in range(7)]
+    (parents, names, kinds, data, first, count, metas) = columns
+    nodes = [node]
+    parents.append(-1)
+    position = 0
+    while position < len(nodes):
+        node = nodes[position]
+        # drop nodes that have been written, so rows of tables can be freed
+        nodes[position] = None
+        names.append(string_id(node.__name__))
+        if position == 0 and options is not None:
+            meta = dict(node._meta) if isinstance(node._meta, dict) else {}
+            meta.pop('ordering', None)
+            meta['reader'] = options
+            metas.append(string_id(json.dumps(meta)))
+        elif isinstance(node._meta, dict):
+            meta = dict([(key, value) for (key, value) in node._meta.items() if not key == 'ordering'])
+            metas.append(string_id(json.dumps(meta)))
+        elif node._meta is not None:
+            metas.append(string_id(json.dumps(node._meta)))
+        else:
+            metas.append(-1)
+        if isinstance(node, ArrayNode):
+            kinds.append(SNAPSHOT_ARRAY)
+            data.append(string_id(json.dumps(node.get_list())))
+            first.append(-1)
+            count.append(0)
+        elif isinstance(node, TableNode):
+            kinds.append(SNAPSHOT_TABLE)
+            table = dict(header=node.__header__, kinds=node.__kinds__, key=node.__key__, typed=node.__typed__,
+                         columns=[column.tolist() if hasattr(column, 'tolist') else list(column)
+                                  for column in node.__columns__])
+            data.append(string_id(json.dumps(table, default=str)))
+            first.append(-1)
+            count.append(0)
+        elif isinstance(node, ContainerNode):
+            children = list(node)
+            kinds.append(SNAPSHOT_LIST if isinstance(node, ListNode) else SNAPSHOT_CONTAINER)
+            data.append(-1)
+            first.append(len(nodes))
+            count.append(len(children))
+            nodes.extend(children)
+            parents.extend([position] * len(children))
+        elif isinstance(node, TypedLiteralNode):
+            kinds.append(SNAPSHOT_TYPED)
+            data.append(string_id(json.dumps(node.get_data(), default=str)))
+            first.append(-1)
+            count.append(0)
+        else:
+            kinds.append(SNAPSHOT_LITERAL)
+            data.append(-1 if node.get_data() is None else string_id(node.get_data()))
+            first.append(-1)
+            count.append(0)
+        position += 1
+    encoded = [text.encode('utf-8') for text in strings]
+    offsets = array('q', [0])
+    for text in encoded:
+        offsets.append(offsets[-1] + len(text))
+    temporary = path + '.tmp'
+    stream = open(temporary, 'wb')
+    try:
+        stream.write(SNAPSHOT_MAGIC)
+        stream.write(struct.pack('3q', 1, len(names), len(encoded)))
+        for column in columns:
+            column.tofile(stream)
+        offsets.tofile(stream)
+        for text in encoded:
+            stream.write(text)
+    finally:
+        stream.close()
+    # workers that mapped the old snapshot keep reading it
+    os.replace(temporary, path)
+
+class Snapshot(object):
+    '''
+    A snapshot file mapped into memory. See save_snapshot.
+
+    The file is never copied into the process: processes that map the same
+    snapshot share its pages, and nodes are only built when they are accessed.
+    '''
+    def __init__(self, path):
+        stream = open(path, 'rb')
+        try:
+            self.buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            stream.close()
+        if self.buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError('%s is not a datatree snapshot.' % path)
+        offset = len(SNAPSHOT_MAGIC)
+        (mark, self.length, strings) = struct.unpack_from('3q', self.buffer, offset)
+        if mark != 1:
+            raise ValueError('Snapshot %s was written with a different byte order.' % path)
+        offset += struct.calcsize('3q')
+        view = memoryview(self.buffer)
+        columns = []
+        for length in [self.length] * 7 + [strings + 1]:
+            columns.append(view[offset:offset + 8 * length].cast('q'))
+            offset += 8 * length
+        (self.parents, self.names, self.kinds, self.data, self.first, self.count, self.metas, self.offsets) = columns
+        self.strings = offset
+
+    def string(self, position):
+        return str(self.buffer[self.strings + self.offsets[position]:self.strings + self.offsets[position + 1]], 'utf-8')
+
+    def meta(self, position):
+        '''
+        Return the stored meta of a node: a dict, a verbose name or None.
+        '''
+        if self.metas[position] < 0:
+            return None
+        return json.loads(self.string(self.metas[position]))
+
+    def node(self, position):
+        '''
+        Build the node at position. Containers among its children are added as
+        LazyNode placeholders.
+        '''
+        name = self.string(self.names[position])
+        kind = self.kinds[position]
+        if kind == SNAPSHOT_LITERAL:
+            node = LiteralNode(name)
+            if self.data[position] >= 0:
+                node.__data__ = self.string(self.data[position])
+        elif kind == SNAPSHOT_TYPED:
+            node = TypedLiteralNode(name)
+            node.__data__ = json.loads(self.string(self.data[position]))
+        elif kind == SNAPSHOT_ARRAY:
+            node = ArrayNode(name, numeric_array(json.loads(self.string(self.data[position]))))
+        elif kind == SNAPSHOT_TABLE:
+            table = json.loads(self.string(self.data[position]))
+            # columns in the storage of CSVReader
+            columns = [array(TYPECODES[kind], column) if kind in TYPECODES else column
+                       for (kind, column) in zip(table['kinds'], table['columns'])]
+            primary_keys = [] if table['key'] is None else [table['header'][table['key']]]
+            node = TableNode(name, table['header'], table['kinds'], columns, primary_keys, table['typed'])
+        else:
+            node = ListNode(name) if kind == SNAPSHOT_LIST else ContainerNode(name)
+            children = []
+            for child in range(self.first[position], self.first[position] + self.count[position]):
+                if not self.kinds[child] in (SNAPSHOT_CONTAINER, SNAPSHOT_LIST, SNAPSHOT_TABLE):
+                    children.append(self.node(child))
+                else:
+                    children.append(LazyNode(self.string(self.names[child]), SnapshotReader(self, child)))
+            node.add_children(children)
+        if isinstance(node, (ArrayNode, TableNode)):
+            # arrays and tables always have meta, with the names of their children as ordering
+            node._meta.update(self.meta(position))
+            return node
+        node._meta = self.meta(position)
+        if isinstance(node, ContainerNode) and isinstance(node._meta, dict):
+            node._meta['ordering'] = list(node.__children__)
+        return node
+
+class SnapshotReader(object):
+    '''
+    Reads a node from a snapshot. Like Reader, it knows the path, modification
+    time and size of the file the node was read from, so that DataTree.refresh
+    can tell whether the snapshot is out of date.
+    '''
+    fresh = False
+
+    def __init__(self, snapshot, position):
+        self.snapshot = snapshot
+        self.position = position
+
+    def _source(self, key):
+        meta = self.snapshot.meta(self.position)
+        return meta.get(key) if isinstance(meta, dict) else None
+
+    @property
+    def path(self):
+        return self._source('path')
+
+    @property
+    def isdir(self):
+        return self._source('mtime') is None
+
+    @property
+    def mtime(self):
+        return self._source('mtime')
+
+    @property
+    def size(self):
+        return self._source('size')
+
+    def read(self):
+        return self.snapshot.node(self.position)
+
+MISSING = object()
+
+def field_value(node, field):
+    '''
+    Return the data at the relative path field below node, or MISSING.
+    '''
+    for part in field.split('/'):
+        if not part:
+            continue
+        if not isinstance(node, ContainerNode) or not part in node:
+            return MISSING
+        node = node[part]
+    if isinstance(node, ContainerNode):
+        return MISSING
+    return node.get_data()
+
+def sort_key(value):
+    '''
+    Key that orders values of different types without raising TypeError.
+    '''
+    if value is None or value is MISSING:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (1, str(value))
+
+class FieldIndex(object):
+    '''
+    Secondary index on a field of the children of a container.
+
+    A 'hash' index answers equality and 'in' filters, a 'sorted' index also
+    answers ranges. Once built, the index is updated entry by entry when
+    children are added to or removed from its container and when data below
+    a child changes. Changes elsewhere, loading placeholders and creating
+    table rows leave it alone. If the children are replaced all at once, as
+    by DataTree.refresh, it is rebuilt on next use.
+    '''
+    def __init__(self, field, kind='hash'):
+        if not kind in ('hash', 'sorted'):
+            raise ValueError('Index kind must be hash or sorted. kind = %s' % kind)
+        self.field = field
+        self.kind = kind
+        self.container = None
+        # root of the tree of the container, whose changes the index follows
+        self.root = None
+        self.stale = False
+        # loading a node while the index is built tells the index from the same thread
+        self.lock = threading.RLock()
+
+    def build(self, container):
+        with self.lock:
+            root = _root(container)
+            if root is not self.root:
+                if self.root is not None:
+                    _unobserve(self, self.root)
+                _observe(self, root)
+                self.root = root
+            self.container = container
+            self.stale = False
+            self.table = {}
+            self.names = []
+            # value of each child, or MISSING
+            self.values = []
+            entries = []
+            for (position, child) in enumerate(container):
+                self.names.append(child.__name__)
+                value = field_value(child, self.field)
+                self.values.append(value)
+                if value is MISSING:
+                    continue
+                if self.kind == 'hash':
+                    self.table.setdefault(value, []).append(position)
+                else:
+                    entries.append((sort_key(value), position))
+            entries.sort()
+            self.keys = [key for (key, position) in entries]
+            self.positions = [position for (key, position) in entries]
+            self.position = dict([(name, position) for (position, name) in enumerate(self.names)])
+
+    def _insert(self, position, value):
+        if value is MISSING:
+            return
+        if self.kind == 'hash':
+            insort(self.table.setdefault(value, []), position)
+            return
+        key = sort_key(value)
+        first = bisect_left(self.keys, key)
+        at = first + bisect_left(self.positions[first:bisect_right(self.keys, key)], position)
+        self.keys.insert(at, key)
+        self.positions.insert(at, position)
+
+    def _delete(self, position, value):
+        if value is MISSING:
+            return
+        if self.kind == 'hash':
+            positions = self.table[value]
+            positions.remove(position)
+            if not positions:
+                del self.table[value]
+            return
+        key = sort_key(value)
+        first = bisect_left(self.keys, key)
+        at = first + self.positions[first:bisect_right(self.keys, key)].index(position)
+        del self.keys[at]
+        del self.positions[at]
+
+    def _update(self, position):
+        '''
+        Read the value of the child at position again.
+        '''
+        value = field_value(self.container._resolve(self.names[position]), self.field)
+        self._delete(position, self.values[position])
+        self.values[position] = value
+        self._insert(position, value)
+
+    def _append(self, name):
+        position = len(self.names)
+        self.names.append(name)
+        self.position[name] = position
+        self.values.append(MISSING)
+        self._update(position)
+
+    def _remove(self, names):
+        removed = sorted([self.position[name] for name in names if name in self.position])
+        for position in removed:
+            self._delete(position, self.values[position])
+        def moved(position):
+            return position - bisect_left(removed, position)
+        if self.kind == 'hash':
+            for (value, positions) in self.table.items():
+                self.table[value] = [moved(position) for position in positions]
+        else:
+            self.positions = [moved(position) for position in self.positions]
+        for position in reversed(removed):
+            del self.names[position]
+            del self.values[position]
+        self.position = dict([(name, position) for (position, name) in enumerate(self.names)])
+
+    def _node_changed(self, names, container, event, old, new):
+        if event in ('load', 'unload') or self.container is None:
+            return
+        below = _names_below(self.container, names, container)
+        if below is None:
+            return
+        with self.lock:
+            if self.stale:
+                return
+            if below:
+                # something below a child changed
+                position = self.position.get(below[0])
+                if position is not None:
+                    self._update(position)
+            elif event == 'add':
+                for node in new:
+                    self._append(node.__name__)
+            elif event == 'remove':
+                self._remove([node.__name__ for node in old])
+            elif event == 'data':
+                for node in new:
+                    if node.__name__ in self.position:
+                        self._update(self.position[node.__name__])
+            else:
+                self.stale = True
+
+    def positions_for(self, container, op, value):
+        '''
+        Return the positions of the children that pass the filter, in order,
+        or None if this index cannot answer it.
+        '''
+        if self.kind == 'hash' and not op in ('==', 'in'):
+            return None
+        if not op in ('==', 'in', '<', '<=', '>', '>='):
+            return None
+        with self.lock:
+            if container is not self.container or self.stale:
+                self.build(container)
+            return self._positions(op, value)
+
+    def _positions(self, op, value):
+        values = value if op == 'in' else [value]
+        if self.kind == 'hash':
+            found = []
+            for value in values:
+                found.extend(self.table.get(value, []))
+            return sorted(found)
+        if op in ('==', 'in'):
+            found = []
+            for value in values:
+                key = sort_key(value)
+                found.extend(self.positions[bisect_left(self.keys, key):bisect_right(self.keys, key)])
+            return sorted(found)
+        key = sort_key(value)
+        # only keys of the same type are comparable with value
+        first = bisect_left(self.keys, (key[0],))
+        last = bisect_left(self.keys, (key[0] + 1,))
+        if op == '<':
+            selected = self.positions[first:bisect_left(self.keys, key)]
+        elif op == '<=':
+            selected = self.positions[first:bisect_right(self.keys, key)]
+        elif op == '>':
+            selected = self.positions[bisect_right(self.keys, key):last]
+        else:
+            selected = self.positions[bisect_left(self.keys, key):last]
+        return sorted(selected)
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+             '>': operator.gt, '>=': operator.ge, 'in': lambda value, values: value in values}
+
+class Query(object):
+    '''
+    Filter, sort, limit and project the children of a container.
+
+        Query(papers.published).where('author', '==', 'Gary Becker').order_by('year').limit(10).select('title')
+
+    Fields are paths relative to each child, like 'author' or 'meta/author'.
+    Filters use the FieldIndex on a field if one is given in indexes.
+    '''
+    def __init__(self, container, indexes={}):
+        self.container = container
+        self.indexes = indexes
+        self.filters = []
+        self.ordering = []
+        self.count = None
+        self.fields = None
+
+    def _copy(self):
+        query = Query(self.container, self.indexes)
+        query.filters = list(self.filters)
+        query.ordering = list(self.ordering)
+        query.count = self.count
+        query.fields = self.fields
+        return query
+
+    def where(self, field, op, value):
+        if not op in OPERATORS:
+            raise ValueError('Unknown operator. op = %s' % op)
+        query = self._copy()
+        query.filters.append((field, op, value))
+        return query
+
+    def order_by(self, field, reverse=False):
+        query = self._copy()
+        query.ordering.append((field, reverse))
+        return query
+
+    def limit(self, count):
+        query = self._copy()
+        query.count = count
+        return query
+
+    def select(self, *fields):
+        query = self._copy()
+        query.fields = fields
+        return query
+
+    def _children(self):
+        filters = list(self.filters)
+        for (number, (field, op, value)) in enumerate(filters):
+            index = self.indexes.get(field)
+            positions = None if index is None else index.positions_for(self.container, op, value)
+            if positions is not None:
+                del filters[number]
+                return ([self.container[index.names[position]] for position in positions], filters)
+        return (list(self.container), filters)
+
+    def all(self):
+        (children, filters) = self._children()
+        output = []
+        for child in children:
+            for (field, op, value) in filters:
+                data = field_value(child, field)
+                try:
+                    if data is MISSING or not OPERATORS[op](data, value):
+                        break
+                except TypeError:
+                    break
+            else:
+                output.append(child)
+        for (field, reverse) in reversed(self.ordering):
+            output.sort(key=lambda child: sort_key(field_value(child, field)), reverse=reverse)
+        if self.count is not None:
+            output = output[:self.count]
+        if self.fields is not None:
+            output = [dict([(field, field_value(child, field)) for field in self.fields]) for child in output]
+            for row in output:
+                for (field, value) in row.items():
+                    if value is MISSING:
+                        row[field] = None
+        return output
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        return len(self.all())
+
+class DataTree(object):
+    '''
+    A tree of nodes read from a folder.
+
+    With lazy=True, folders and files are only read when they are first
+    accessed through attribute or item lookup, iteration or get_by_url.
+
+    With workers > 1, files are read and deserialized in parallel.
+
+    cache is a ParseCache or the name of a cache directory. Files that have
+    not changed since they were cached are not parsed again.
+
+    With streaming=True, multi-document YAML files are read one document at a time.
+
+    With columnar=True, CSV files are stored column by column in TableNodes,
+    and with infer_types=True their numeric and boolean columns become arrays.
+
+    indexes is a list of (url, field) or (url, field, kind) tuples. A FieldIndex
+    is built for each after loading and is used by query.
+
+    With instrument=True, or when hooks are given, reading is timed file by file
+    and folder by folder; see stats. Each hook is called with every record.
+
+    With typed=True, literals keep the types they are parsed with, and lists
+    of numbers become ArrayNodes; see parse_object.
+
+    exclude is a list of regular expressions for names of folders and files
+    that are not read. include is a list of path patterns, such as
+    /papers/published/**; if given, only the folders and files they select are
+    read. See PathSelector.
+
+    With breadth_first=True, folders are listed level by level before files
+    are read; see FolderReader.
+
+    memory_budget is the number of bytes that the nodes read from files may
+    take. Files that have not been used for the longest time are unloaded when
+    it is exceeded, and read again when they are accessed; see MemoryBudget.
+    Lookups with get_by_url count as use.
+    '''
+    def __init__(self, root, exclude=[], primary_keys=[], *, lazy=False, workers=0, cache=None, streaming=False,
+                 columnar=False, infer_types=False, indexes=[], instrument=False, hooks=[], typed=False, include=[],
+                 breadth_first=False, memory_budget=None):
+        xexclude = []
+        for pattern in exclude:
+            xexclude.append(re.compile(pattern))
+        selector = PathSelector(root, xexclude, include)
+        if isinstance(cache, str):
+            cache = ParseCache(cache)
+        self.cache = cache
+        self.load_stats = LoadStats(hooks) if instrument or hooks else None
+        self.budget = MemoryBudget(memory_budget, self._unloaded) if memory_budget is not None else None
+        self.reader = FolderReader(root, xexclude, primary_keys, lazy=lazy, workers=workers, cache=cache,
+                                   streaming=streaming, columnar=columnar, infer_types=infer_types,
+                                   stats=self.load_stats, typed=typed, selector=selector,
+                                   breadth_first=breadth_first, budget=self.budget)
+        self.root = self.reader.read()
+        if self.budget is not None:
+            self.budget.root = self.root
+        self.index = UrlIndex(self.root)
+        self.indexes = {}
+        for spec in indexes:
+            self.create_index(*spec)
+
+    @classmethod
+    def load_snapshot(cls, path, root=None):
+        '''
+        Return a tree that reads its nodes from a snapshot file, see save_snapshot.
+
+        The file is memory mapped and nodes are built when they are first accessed.
+        refresh compares the snapshot with the folder it was saved from, or with root,
+        and reads changed files with the options the tree was read with.
+        '''
+        snapshot = Snapshot(path)
+        tree = cls.__new__(cls)
+        tree.cache = None
+        tree.load_stats = None
+        tree.budget = None
+        tree.root = snapshot.node(0)
+        options = {}
+        if isinstance(tree.root._meta, dict):
+            options = tree.root._meta.pop('reader', {})
+            if root is None:
+                root = tree.root._meta.get('path')
+        tree.reader = None
+        if root is not None and os.path.isdir(root):
+            exclude = [re.compile(pattern) for pattern in options.pop('exclude', [])]
+            selector = PathSelector(root, exclude, options.pop('include', []))
+            tree.reader = FolderReader(root, exclude, options.pop('primary_keys', []), lazy=True,
+                                       selector=selector, **options)
+        tree.index = UrlIndex(tree.root)
+        tree.indexes = {}
+        return tree
+
+    def save_snapshot(self, path):
+        '''
+        Save the tree to a snapshot file, reading every node that has not been read yet.
+        The options of the reader are saved with it, see load_snapshot.
+        '''
+        options = None
+        if self.reader is not None:
+            reader = self.reader
+            options = dict(exclude=[pattern.pattern for pattern in reader.exclude], include=reader.selector.include,
+                           primary_keys=reader.primary_keys, streaming=reader.streaming, columnar=reader.columnar,
+                           infer_types=reader.infer_types, typed=reader.typed, breadth_first=reader.breadth_first)
+        save_snapshot(self.root, path, options)
+
+    def _read_child(self, reader):
+        if self.reader.lazy:
+            return LazyNode(reader.basename, reader)
+        return reader.read()
+
+    def _compare(self, folder, reader, changes, resolve=True):
+        '''
+        Compare folder with the folder on disk that reader reads and record the
+        changes. Return the children that folder should have, in order, each with
+        the reader of the subfolder that has to be compared in turn, or None.
+
+        Placeholders of subfolders to compare are replaced with the loaded
+        folder, unless resolve is False.
+        '''
+        old = folder.__children__
+        entries = []
+        seen = set()
+        for child in reader._children():
+            name = admissible_slug(child.basename)
+            if name in seen:
+                raise NameError('Children must have unique names. node = %s' % folder.get_absolute_url())
+            node = old.get(name)
+            compare = None
+            if node is None:
+                changes['added'].append(child.path)
+                node = self._read_child(child)
+            elif not child.is_current(node):
+                changes['modified'].append(child.path)
+                self._forget(child.path)
+                node = self._read_child(child)
+            elif child.isdir and not (isinstance(node, LazyNode) and node.__reader__.fresh):
+                # folders from a snapshot are checked even if they have not been accessed
+                if resolve:
+                    node = folder._resolve(name)
+                compare = child
+            entries.append((node, compare))
+            seen.add(name)
+        for name in folder._keys():
+            if not name in seen:
+                node = old[name]
+                changes['removed'].append(node.__reader__.path if isinstance(node, LazyNode) else node.get_metadata('path'))
+                self._forget(changes['removed'][-1])
+        return entries
+
+    def _forget(self, path):
+        if self.budget is not None:
+            self.budget.discard(path)
+
+    def _changed(self, folder, nodes):
+        old = folder.__children__
+        return [node.__name__ for node in nodes] != list(folder._keys()) or any([old.get(node.__name__) is not node for node in nodes])
+
+    def refresh(self):
+        '''
+        Re-read the folders and files that changed on disk since they were read.
+
+        Unchanged nodes are kept, so references to them stay valid. Returns the
+        paths that were added, removed and modified.
+
+        The tree is changed in place. Use reload instead if other threads read
+        the tree at the same time.
+        '''
+        if self.reader is None:
+            raise IOError('The tree has no source folder to refresh from.')
+        changes = dict(added=[], removed=[], modified=[])
+        stack = [(self.root, self.reader._reader(FolderReader, self.reader.path))]
+        while stack:
+            (folder, reader) = stack.pop()
+            entries = self._compare(folder, reader, changes)
+            new = [node for (node, compare) in entries]
+            stack.extend([(node, compare) for (node, compare) in entries if compare is not None])
+            if self._changed(folder, new):
+                folder._replace_children(new)
+        return changes
+
+    def _reload_folder(self, folder, reader, changes, shared, private=False):
+        '''
+        Return folder as it is now on disk, or None if nothing below it changed.
+        Folders of the current version are copied, sharing the unchanged children,
+        and are not changed: placeholders are loaded without being replaced, and
+        each shared node is appended to shared with its new parent, to be moved
+        when the new version is swapped in. A private folder, loaded for this
+        reload only, is changed in place.
+        '''
+        entries = self._compare(folder, reader, changes, resolve=False)
+        new = []
+        changed = False
+        for (node, compare) in entries:
+            if compare is not None:
+                loaded = node.load() if isinstance(node, LazyNode) else node
+                reloaded = self._reload_folder(loaded, compare, changes, shared, private or loaded is not node)
+                if reloaded is not None:
+                    node = reloaded
+                    changed = True
+            new.append(node)
+        if not self._changed(folder, new):
+            return folder if changed and private else None
+        if private:
+            folder._replace_children(new)
+            return folder
+        copy = ContainerNode(folder.__name__)
+        copy._meta = dict([(key, value) for (key, value) in folder.__meta__.items() if not key == 'ordering'])
+        for node in new:
+            copy.__children__[node.__name__] = node
+            if node.__parent__ is None:
+                node.__parent__ = copy
+            else:
+                # still a child of the old folder too; its URL is the same in both
+                shared.append((node, copy))
+        copy._meta['ordering'] = [node.__name__ for node in new]
+        return copy
+
+    def reload(self):
+        '''
+        Like refresh, but the tree is never changed in place. Folders with
+        changes below them are copied, sharing every unchanged subtree, and the
+        new version is swapped in at once when it is complete.
+
+        Threads that hold a node, or that are in get_by_url, keep reading the
+        version they started with, so they never see a half-built tree and do
+        not wait for the reload. When the new version is complete, the shared
+        subtrees are moved under its folders: the __parent__ of every node of
+        the new version is in the new version, and nothing in it refers to the
+        old one, which is freed when its readers are done. The old version can
+        still be read from its root down.
+        '''
+        if self.reader is None:
+            raise IOError('The tree has no source folder to refresh from.')
+        changes = dict(added=[], removed=[], modified=[])
+        index = self.index
+        shared = []
+        root = self._reload_folder(index.root, self.reader._reader(FolderReader, self.reader.path), changes, shared)
+        if root is None:
+            return changes
+        # before the indexes are built, so that they follow the tree of the new root
+        for (node, parent) in shared:
+            node.__parent__ = parent
+        indexes = {}
+        for (url, fields) in self.indexes.items():
+            try:
+                container = reduce(lambda node, child: node[child], [root] + [part for part in url.split('/') if part])
+            except KeyError:
+                continue
+            for (field, old) in fields.items():
+                indexes.setdefault(url, {})[field] = FieldIndex(field, old.kind)
+                indexes[url][field].build(container)
+        self.root = root
+        self.indexes = indexes
+        if self.budget is not None:
+            self.budget.root = root
+        # readers switch to the new version here
+        self.index = UrlIndex(root)
+        return changes
+
+    def watch(self, interval=1.0, callback=None, reload=False):
+        '''
+        Start a background thread that calls refresh, or reload if reload is
+        True, every interval seconds.
+        '''
+        watcher = Watcher(self, interval, callback, reload)
+        watcher.start()
+        return watcher
+
+    def materialize(self):
+        '''
+        Read every folder and file that has not been loaded yet.
+        '''
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            stack.extend([child for child in node if is_folder(child)])
+
+    def loaded(self):
+        '''
+        Return the paths of folders and files that have been read so far.
+        '''
+        paths = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            paths.append(node.get_metadata('path'))
+            if is_folder(node):
+                children = [node.__children__[key] for key in node._keys()]
+                stack.extend(reversed([child for child in children if not isinstance(child, LazyNode)]))
+        return paths
+
+    def _unloaded(self, url):
+        # files can be unloaded while the tree is first read, before there is an index
+        index = getattr(self, 'index', None)
+        if index is not None:
+            index.discard(url)
+
+    def get_by_url(self, url):
+        # the index and its root belong to the same version of the tree, see reload
+        index = self.index
+        node = index.lookup(url)
+        if node is None:
+            url = os.path.normpath(url)
+            parts = url.split('/')
+            parts = [part for part in parts if not part=='']
+            def lookup(node, child):
+                return node[child]
+            node = reduce(lookup, [index.root]+parts)
+            index.add(node)
+        if self.budget is not None:
+            self.budget.touch(node)
+        return node
+
+    def get_by_prefix(self, url):
+        '''
+        Return the loaded nodes at and below url, in URL order.
+        '''
+        return self.index.prefix(url)
+
+    def export(self, url, stream, format='json', depth=None):
+        '''
+        Write the node at url to stream as JSON or YAML. See export_json.
+        '''
+        if format == 'json':
+            export_json(self.get_by_url(url), stream, depth)
+        elif format == 'yaml':
+            export_yaml(self.get_by_url(url), stream, depth)
+        else:
+            raise ValueError('Export format must be json or yaml. format = %s' % format)
+
+    def stats(self, url='/', top=10):
+        '''
+        Report on loading and memory use.
+
+        With instrumentation on, the report has the totals of LoadStats.report,
+        including the top slowest files. It always has an estimate of the bytes
+        used below each child of the node at url, under memory.
+        '''
+        if self.load_stats is None:
+            report = dict(instrumented=False)
+        else:
+            report = self.load_stats.report(top)
+            report['instrumented'] = True
+        node = self.get_by_url(url)
+        if isinstance(node, ContainerNode) and not isinstance(node, TableNode):
+            report['memory'] = dict([(child.get_absolute_url(), footprint(child))
+                                     for child in node.__children__.values()])
+        report['memory_total'] = footprint(node)
+        if self.budget is not None:
+            report['budget'] = self.budget.stats()
+        return report
+
+    def create_index(self, url, field, kind='hash'):
+        '''
+        Index field of the children of the container at url for query.
+        '''
+        container = self.get_by_url(url)
+        index = FieldIndex(field, kind)
+        index.build(container)
+        self.indexes.setdefault(container.get_absolute_url(), {})[field] = index
+        return index
+
+    def query(self, url):
+        '''
+        Return a Query over the children of the container at url.
+
+            tree.query('/papers/published').where('author', '==', 'Gary Becker').select('title').all()
+        '''
+        container = self.get_by_url(url)
+        return Query(container, self.indexes.get(container.get_absolute_url(), {}))
+
+    def glob(self, pattern):
+        '''
+        Return the loaded nodes whose URL matches pattern, in URL order.
+
+            tree.glob('/papers/published/*')
+            tree.glob('/papers/**/title')
+        '''
+        return self.index.glob(pattern)
+
+def is_folder(node):
+    '''
+    Check whether node was read from a folder, rather than from a file.
+    '''
+    return isinstance(node, ContainerNode) and 'path' in node.__meta__ and not 'mtime' in node.__meta__
+
+class Watcher(threading.Thread):
+    '''
+    Polls a DataTree for changes on disk. callback, if given, is called with the
+    changes returned by DataTree.refresh whenever something changed. The last
+    exception raised by refresh is kept in error and polling continues.
+    With reload=True, DataTree.reload is called instead of refresh.
+    '''
+    def __init__(self, tree, interval=1.0, callback=None, reload=False):
+        super(Watcher, self).__init__()
+        self.daemon = True
+        self.tree = tree
+        self.reload = reload
+        self.interval = interval
+        self.callback = callback
+        self.error = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                changes = self.tree.reload() if self.reload else self.tree.refresh()
+            except Exception as error:
+                self.error = error
+                continue
+            if self.callback is not None and any(changes.values()):
+                self.callback(changes)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class AsyncDataTree(object):
+    '''
+    A DataTree for asyncio applications. Reading and parsing run in an executor,
+    at most concurrency at a time, so that the event loop is never blocked:
+
+        tree = await AsyncDataTree.create('papers', lazy=True)
+        paper = await tree.get_by_url('/published/paper1')
+        changes = await tree.refresh()
+
+    Concurrent requests for a lazy folder or file that is being loaded wait for
+    the same load. executor is passed to loop.run_in_executor; None is the
+    default thread pool of the loop.
+    '''
+    def __init__(self, tree, concurrency=4, executor=None):
+        self.tree = tree
+        self.executor = executor
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # (container, key) -> future of the load in progress
+        self.pending = {}
+
+    @classmethod
+    async def create(cls, root, concurrency=4, executor=None, **options):
+        '''
+        Read a DataTree in the executor. options are passed to DataTree.
+        '''
+        loop = asyncio.get_running_loop()
+        tree = await loop.run_in_executor(executor, partial(DataTree, root, **options))
+        return cls(tree, concurrency, executor)
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    async def _run(self, function, *args):
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def child(self, node, name):
+        '''
+        Return node[name], loading it in the executor if it has not been loaded yet.
+        '''
+        key = name.lower()
+        if not (isinstance(node, ContainerNode) and isinstance(node.__children__.get(key), LazyNode)):
+            return node[name]
+        future = self.pending.get((node, key))
+        if future is None:
+            future = asyncio.ensure_future(self._run(node._resolve, key))
+            self.pending[(node, key)] = future
+            future.add_done_callback(lambda future: self.pending.pop((node, key), None))
+        # one caller giving up does not cancel the load for the others
+        return await asyncio.shield(future)
+
+    async def get_by_url(self, url):
+        index = self.tree.index
+        node = index.lookup(url)
+        if node is not None:
+            return node
+        url = os.path.normpath(url)
+        parts = [part for part in url.split('/') if not part=='']
+        node = index.root
+        for part in parts:
+            node = await self.child(node, part)
+        index.add(node)
+        return node
+
+    async def refresh(self):
+        return await self._run(self.tree.refresh)
 
+    async def reload(self):
+        return await self._run(self.tree.reload)
 
+    async def materialize(self):
+        return await self._run(self.tree.materialize)
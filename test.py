@@ -5,6 +5,15 @@ import os
 from shutil import rmtree
 import yaml
 import re
+import io
+import json
+import time
+import asyncio
+import threading
+import weakref
+import gc
+import datetime
+import array
 
 # upgrading to Python 3, where all strings are unicode
 def unicode(x):
@@ -83,6 +92,932 @@ class TestYAMLLoader(ut.TestCase):
         tree = module.DataTree('testdata', primary_keys=['id', 'slug'])
         self.assertIsInstance(tree.root.folder2.list.slug1, module.ContainerNode)
 
+    def test_options_are_passed_by_keyword(self):
+        tree = module.DataTree('testdata', ['^\..*$'], ['id'], lazy=True)
+        reader = tree.reader._reader(module.YAMLReader, 'testdata/folder2/list.yaml')
+        self.assertListEqual([reader.primary_keys, reader.lazy], [['id'], True])
+        self.assertIsInstance(reader.read().slug1, module.ContainerNode)
+        self.assertRaises(TypeError, module.DataTree, 'testdata', [], [], True)
+        self.assertRaises(TypeError, module.FolderReader, 'testdata', [], [], True)
+
+class TestLazyLoader(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        os.makedirs('testdata/folder2')
+        data = dict(title='Test document', content='Test data')
+        for name in ['testdata/document.yaml', 'testdata/folder1/document.yaml', 'testdata/folder2/document.yaml']:
+            stream = open(name, 'w')
+            yaml.dump(data, stream)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_nothing_read_before_access(self):
+        tree = module.DataTree('testdata', lazy=True)
+        self.assertListEqual(tree.loaded(), [os.path.normpath('testdata')])
+
+    def test_attribute_access_loads_subtree(self):
+        tree = module.DataTree('testdata', lazy=True)
+        self.assertEqual(unicode(tree.root.folder1.document.title), 'Test document')
+        self.assertListEqual(tree.loaded(), [os.path.normpath(path) for path in
+            ['testdata', 'testdata/folder1', 'testdata/folder1/document.yaml']])
+
+    def test_get_by_url_loads_subtree(self):
+        tree = module.DataTree('testdata', lazy=True)
+        self.assertEqual(tree.get_by_url('/folder2/document/content').get_data(), 'Test data')
+        self.assertNotIn(os.path.normpath('testdata/folder1'), tree.loaded())
+
+    def test_parent_of_loaded_node(self):
+        tree = module.DataTree('testdata', lazy=True)
+        self.assertIs(tree.root.folder1.document.__parent__, tree.root.folder1)
+        self.assertEqual(tree.root.folder1.document.get_absolute_url(), '/folder1/document')
+
+    def test_materialize(self):
+        tree = module.DataTree('testdata', lazy=True)
+        tree.materialize()
+        self.assertEqual(len(tree.loaded()), 6)
+        self.assertEqual(unicode(tree.root), unicode(module.DataTree('testdata').root))
+
+    def test_iteration_loads_children(self):
+        tree = module.DataTree('testdata', lazy=True)
+        for child in tree.root:
+            self.assertNotIsInstance(child, module.LazyNode)
+
+class TestParallelLoader(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        os.makedirs('testdata/folder2')
+        for k in range(10):
+            stream = open('testdata/folder1/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Document %d' % k, number=k), stream)
+            stream.close()
+        stream = open('testdata/folder2/list.yaml', 'w')
+        yaml.dump([dict(id='slug1', content=1), dict(id='slug2', content=2)], stream)
+        stream.close()
+        stream = open('testdata/folder2/table.csv', 'w')
+        stream.write('a,b\n1,2\n3,4\n')
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_same_tree_as_serial(self):
+        serial = module.DataTree('testdata', primary_keys=['id'])
+        parallel = module.DataTree('testdata', primary_keys=['id'], workers=4)
+        self.assertEqual(unicode(parallel.root), unicode(serial.root))
+        self.assertListEqual([child.__name__ for child in parallel.root.folder1],
+            [child.__name__ for child in serial.root.folder1])
+        self.assertIs(parallel.root.folder2.list.slug1.__parent__.__parent__, parallel.root.folder2)
+
+    def test_duplicate_names_rejected(self):
+        stream = open('testdata/folder1/doc0.json', 'w')
+        stream.write('{"a": 1}')
+        stream.close()
+        self.assertRaises(NameError, module.DataTree, 'testdata', workers=4)
+
+    def test_parse_errors_raised(self):
+        stream = open('testdata/folder1/broken.yaml', 'w')
+        stream.write('a: [1, 2')
+        stream.close()
+        self.assertRaises(yaml.YAMLError, module.DataTree, 'testdata', workers=4)
+
+    def test_parse_errors_name_file(self):
+        stream = open('testdata/folder1/broken.yaml', 'w')
+        stream.write('a: [1, 2')
+        stream.close()
+        messages = []
+        for workers in [0, 4]:
+            try:
+                module.DataTree('testdata', workers=workers)
+            except yaml.YAMLError as error:
+                messages.append(str(error))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0], messages[1])
+        self.assertIn(os.path.normpath('testdata/folder1/broken.yaml'), messages[1])
+
+class TestStats(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        for k in range(3):
+            stream = open('testdata/folder1/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Document %d' % k, items=list(range(k))), stream)
+            stream.close()
+        stream = open('testdata/table.csv', 'w')
+        stream.write('a,b\n1,2\n')
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_not_instrumented(self):
+        tree = module.DataTree('testdata')
+        report = tree.stats()
+        self.assertFalse(report['instrumented'])
+        self.assertIsNone(tree.reader.stats)
+        self.assertGreater(report['memory_total'], 0)
+
+    def test_file_records(self):
+        tree = module.DataTree('testdata', instrument=True)
+        report = tree.stats(top=2)
+        self.assertEqual(report['files'], 4)
+        self.assertEqual(report['folders'], 2)
+        self.assertEqual(report['bytes'], sum([os.path.getsize(path) for path in tree.loaded() if os.path.isfile(path)]))
+        self.assertEqual(report['readers']['YAMLReader']['files'], 3)
+        self.assertEqual(len(report['slowest']), 2)
+        self.assertEqual(report['nodes'], (3 + 4 + 5) + 4)
+        self.assertListEqual(sorted(report['memory']), ['/folder1', '/table'])
+
+    def test_hooks(self):
+        records = []
+        tree = module.DataTree('testdata', hooks=[records.append])
+        self.assertListEqual(sorted([record['kind'] for record in records]), ['file'] * 4 + ['folder'] * 2)
+
+    def test_parallel_and_lazy(self):
+        records = []
+        tree = module.DataTree('testdata', workers=2, hooks=[lambda record: records.append(record)])
+        self.assertEqual(len([record for record in records if record['kind'] == 'file']), 4)
+        tree = module.DataTree('testdata', lazy=True, instrument=True)
+        self.assertEqual(tree.stats()['files'], 0)
+        tree.root.folder1.doc1
+        self.assertEqual(tree.stats()['files'], 1)
+
+class TestParseCache(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        for k in range(3):
+            stream = open('testdata/folder1/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Document %d' % k), stream)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+        if os.path.isdir('testcache'):
+            rmtree('testcache')
+
+    def test_second_load_hits_cache(self):
+        module.DataTree('testdata', cache='testcache')
+        cache = module.ParseCache('testcache')
+        tree = module.DataTree('testdata', cache=cache)
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['misses'], 0)
+        self.assertEqual(tree.root.folder1.doc1.title.get_data(), 'Document 1')
+
+    def test_changed_file_misses(self):
+        module.DataTree('testdata', cache='testcache')
+        stream = open('testdata/folder1/doc1.yaml', 'w')
+        yaml.dump(dict(title='Changed document'), stream)
+        stream.close()
+        cache = module.ParseCache('testcache', hash_contents=True)
+        tree = module.DataTree('testdata', cache=cache)
+        self.assertEqual(tree.root.folder1.doc1.title.get_data(), 'Changed document')
+
+    def test_hash_mismatch_misses(self):
+        cache = module.ParseCache('testcache', hash_contents=True)
+        module.DataTree('testdata', cache=cache)
+        self.assertRaises(KeyError, cache.get, 'testdata/folder1/doc1.yaml', (0, 0, ''))
+
+    def test_size_cap_evicts(self):
+        cache = module.ParseCache('testcache', max_bytes=1)
+        module.DataTree('testdata', cache=cache)
+        self.assertEqual(cache.stats()['evictions'], 3)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_parallel_load_uses_cache(self):
+        module.DataTree('testdata', cache='testcache', workers=2)
+        cache = module.ParseCache('testcache')
+        module.DataTree('testdata', cache=cache, workers=2)
+        self.assertEqual(cache.stats()['hits'], 3)
+
+class TestRefresh(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        os.makedirs('testdata/folder2')
+        for name in ['testdata/folder1/doc1.yaml', 'testdata/folder1/doc2.yaml', 'testdata/folder2/doc3.yaml']:
+            self.write(name, dict(title=name))
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def write(self, name, data):
+        stream = open(name, 'w')
+        yaml.dump(data, stream)
+        stream.close()
+
+    def test_nothing_changed(self):
+        tree = module.DataTree('testdata')
+        folder1 = tree.root.folder1
+        changes = tree.refresh()
+        self.assertDictEqual(changes, dict(added=[], removed=[], modified=[]))
+        self.assertIs(tree.root.folder1, folder1)
+
+    def test_modified_file(self):
+        tree = module.DataTree('testdata')
+        doc2 = tree.root.folder1.doc2
+        self.write('testdata/folder1/doc1.yaml', dict(title='Changed title', extra='x'))
+        changes = tree.refresh()
+        self.assertListEqual(changes['modified'], [os.path.normpath('testdata/folder1/doc1.yaml')])
+        self.assertEqual(tree.root.folder1.doc1.title.get_data(), 'Changed title')
+        self.assertIs(tree.root.folder1.doc1.__parent__, tree.root.folder1)
+        self.assertIs(tree.root.folder1.doc2, doc2)
+
+    def test_replaced_nodes_detached(self):
+        tree = module.DataTree('testdata')
+        doc1 = tree.root.folder1.doc1
+        doc2 = tree.root.folder1.doc2
+        self.write('testdata/folder1/doc1.yaml', dict(title='Changed title'))
+        tree.refresh()
+        self.assertIsNone(doc1.__parent__)
+        self.assertEqual(doc1.get_absolute_url(), '/')
+        self.assertIs(doc2.__parent__, tree.root.folder1)
+        self.assertEqual(tree.root.folder1.doc1.get_absolute_url(), '/folder1/doc1')
+        self.assertListEqual(list(tree.root.folder1._keys()), ['doc1', 'doc2'])
+
+    def test_added_and_removed(self):
+        tree = module.DataTree('testdata')
+        os.remove('testdata/folder2/doc3.yaml')
+        os.makedirs('testdata/folder3')
+        self.write('testdata/folder3/doc4.yaml', dict(title='new'))
+        changes = tree.refresh()
+        self.assertListEqual(changes['removed'], [os.path.normpath('testdata/folder2/doc3.yaml')])
+        self.assertListEqual(changes['added'], [os.path.normpath('testdata/folder3')])
+        self.assertNotIn('doc3', tree.root.folder2)
+        self.assertEqual(tree.get_by_url('/folder3/doc4/title').get_data(), 'new')
+
+    def test_ordering_matches_fresh_load(self):
+        tree = module.DataTree('testdata')
+        self.write('testdata/folder1/doc0.yaml', dict(title='new'))
+        tree.refresh()
+        fresh = module.DataTree('testdata')
+        self.assertListEqual(tree.root.folder1.__meta__['ordering'], fresh.root.folder1.__meta__['ordering'])
+        self.assertEqual(unicode(tree.root), unicode(fresh.root))
+
+    def test_lazy_tree(self):
+        tree = module.DataTree('testdata', lazy=True)
+        tree.root.folder1.doc1
+        self.write('testdata/folder1/doc1.yaml', dict(title='Changed title'))
+        self.write('testdata/folder1/doc5.yaml', dict(title='new'))
+        tree.refresh()
+        self.assertEqual(tree.root.folder1.doc1.title.get_data(), 'Changed title')
+        self.assertEqual(tree.root.folder1.doc5.title.get_data(), 'new')
+
+    def test_watcher(self):
+        tree = module.DataTree('testdata')
+        seen = []
+        watcher = tree.watch(0.01, seen.append)
+        self.write('testdata/folder1/doc9.yaml', dict(title='new'))
+        for k in range(500):
+            if seen:
+                break
+            time.sleep(0.01)
+        watcher.stop()
+        self.assertEqual(tree.root.folder1.doc9.title.get_data(), 'new')
+
+class TestSelectiveLoading(ut.TestCase):
+    def setUp(self):
+        for folder in ['testdata/papers/published', 'testdata/papers/drafts/old', 'testdata/people']:
+            os.makedirs(folder)
+        for name in ['testdata/papers/published/paper1.yaml', 'testdata/papers/published/paper2.yaml',
+                     'testdata/papers/drafts/paper3.yaml', 'testdata/papers/drafts/old/paper1.yaml',
+                     'testdata/papers/index.yaml', 'testdata/people/alice.yaml']:
+            stream = open(name, 'w')
+            yaml.dump(dict(title=name), stream)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def urls(self, tree):
+        return sorted([node.get_absolute_url() for node in tree.get_by_prefix('/') if 'mtime' in node.__meta__])
+
+    def test_prefix(self):
+        tree = module.DataTree('testdata', include=['/papers/published/**'])
+        self.assertListEqual(self.urls(tree), ['/papers/published/paper1', '/papers/published/paper2'])
+        self.assertListEqual(list(tree.root._keys()), ['papers'])
+
+    def test_folder_selects_everything_below(self):
+        tree = module.DataTree('testdata', include=['/papers/drafts'])
+        self.assertListEqual(self.urls(tree), ['/papers/drafts/old/paper1', '/papers/drafts/paper3'])
+
+    def test_glob(self):
+        tree = module.DataTree('testdata', include=['/papers/**/paper1.yaml', '/people/*.yaml'])
+        self.assertListEqual(self.urls(tree), ['/papers/drafts/old/paper1', '/papers/published/paper1', '/people/alice'])
+
+    def test_include_and_exclude(self):
+        tree = module.DataTree('testdata', include=['/papers/**'], exclude=['^old$', '^index'])
+        self.assertListEqual(self.urls(tree), ['/papers/drafts/paper3', '/papers/published/paper1', '/papers/published/paper2'])
+
+    def test_exclude_patterns_kept_apart(self):
+        selector = module.PathSelector('testdata', ['(?i)^readme', r'^(b)\1$', re.compile('^notes', re.I)])
+        for name in ['README.yaml', 'bb', 'Notes.yaml']:
+            self.assertFalse(selector.admits('/papers', name))
+        for name in ['ba', 'paper1.yaml']:
+            self.assertTrue(selector.admits('/papers', name))
+
+    def test_pruned_before_stat(self):
+        stat = os.stat
+        paths = []
+        def record(path, *args, **kwargs):
+            paths.append(os.fspath(path))
+            return stat(path, *args, **kwargs)
+        os.stat = record
+        try:
+            tree = module.DataTree('testdata', include=['/papers/published/**'])
+        finally:
+            os.stat = stat
+        self.assertListEqual([path for path in paths if 'people' in path or 'drafts' in path], [])
+        self.assertEqual(len(tree.root.papers.published), 2)
+
+    def test_refresh_keeps_selection(self):
+        tree = module.DataTree('testdata', include=['/papers/published/**'])
+        stream = open('testdata/people/bob.yaml', 'w')
+        yaml.dump(dict(title='bob'), stream)
+        stream.close()
+        self.assertDictEqual(tree.refresh(), dict(added=[], removed=[], modified=[]))
+
+class TestWalker(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/a/b/c')
+        os.makedirs('testdata/d')
+        for name in ['testdata/doc0.yaml', 'testdata/a/doc1.yml', 'testdata/a/b/doc2.json', 'testdata/a/b/c/doc3.yaml',
+                     'testdata/d/doc4.yaml', 'testdata/README.md', 'testdata/a/notes.txt']:
+            stream = open(name, 'w')
+            stream.write('title: %s\n' % name if not name.endswith('.json') else '{"title": "%s"}' % name)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+        module.DISPATCHER.clear()
+        module.DISPATCHER.update(module.BUILTIN_DISPATCHER)
+        module.EXTENSIONS.pop('.txt', None)
+
+    def test_reader_for(self):
+        self.assertIs(module.reader_for('a/b.yaml'), module.YAMLReader)
+        self.assertIs(module.reader_for('b.yml'), module.YAMLReader)
+        self.assertIs(module.reader_for('b.csv'), module.CSVReader)
+        self.assertIsNone(module.reader_for('README.md'))
+        self.assertIsNone(module.reader_for('.yaml'))
+
+    def test_register_reader(self):
+        module.register_reader('.txt', module.YAMLReader)
+        module.register_reader('^.*README\\.md$', module.YAMLReader)
+        self.assertIs(module.reader_for('notes.txt'), module.YAMLReader)
+        tree = module.DataTree('testdata')
+        self.assertIn('readme', tree.root)
+        self.assertEqual(tree.root.a.notes.title.get_data(), os.path.normpath('testdata/a/notes.txt'))
+
+    def test_patterns_before_extensions(self):
+        self.assertIs(module.DISPATCHER[module.YAML_FILE], module.YAMLReader)
+        module.register_reader('^.*/d/.*\\.yaml$', module.JSONReader)
+        self.assertIs(module.reader_for('testdata/d/doc4.yaml'), module.JSONReader)
+        self.assertIs(module.reader_for('testdata/a/doc1.yml'), module.YAMLReader)
+        module.DISPATCHER[module.CSV_FILE] = module.YAMLReader
+        self.assertIs(module.reader_for('b.csv'), module.YAMLReader)
+        del module.DISPATCHER[module.JSON_FILE]
+        self.assertIsNone(module.reader_for('b.json'))
+
+    def test_breadth_first(self):
+        tree = module.DataTree('testdata')
+        for options in [dict(breadth_first=True), dict(breadth_first=True, workers=2)]:
+            other = module.DataTree('testdata', **options)
+            self.assertEqual(unicode(other.root), unicode(tree.root))
+            self.assertListEqual(list(other.root.a._keys()), list(tree.root.a._keys()))
+
+    def test_breadth_first_lists_folders_first(self):
+        tree = module.DataTree('testdata', breadth_first=True, instrument=True)
+        paths = [record['path'] for record in tree.load_stats.folders]
+        self.assertEqual(paths[0], os.path.normpath('testdata'))
+        self.assertListEqual(sorted(paths[1:3]), [os.path.normpath('testdata/a'), os.path.normpath('testdata/d')])
+        self.assertEqual(paths[-1], os.path.normpath('testdata/a/b/c'))
+
+class TestMemoryBudget(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder')
+        for k in range(5):
+            stream = open('testdata/folder/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Document %d' % k, body='x' * 1000), stream)
+            stream.close()
+        self.size = module.footprint(module.DataTree('testdata').root.folder.doc0)
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def resident(self, tree):
+        return [key for key in tree.root.folder._keys()
+                if not isinstance(tree.root.folder.__children__[key], module.LazyNode)]
+
+    def test_within_budget(self):
+        tree = module.DataTree('testdata', memory_budget=int(self.size * 2.5))
+        self.assertEqual(len(self.resident(tree)), 2)
+        self.assertLessEqual(tree.budget.size, int(self.size * 2.5))
+        self.assertEqual(tree.budget.evictions, 3)
+
+    def test_transparent_reload(self):
+        tree = module.DataTree('testdata', memory_budget=int(self.size * 2.5))
+        ordering = list(tree.root.folder._keys())
+        doc0 = tree.get_by_url('/folder/doc0')
+        self.assertEqual(doc0.title.get_data(), 'Document 0')
+        self.assertIs(doc0.__parent__, tree.root.folder)
+        self.assertEqual(doc0.get_metadata('path'), os.path.normpath('testdata/folder/doc0.yaml'))
+        self.assertListEqual(list(tree.root.folder._keys()), ordering)
+        self.assertEqual(tree.budget.reloads, 1)
+        self.assertEqual(tree.budget.evictions, 4)
+
+    def test_lookups_keep_files_loaded(self):
+        tree = module.DataTree('testdata', lazy=True, memory_budget=int(self.size * 2.5))
+        for k in range(5):
+            tree.get_by_url('/folder/doc0/title')
+            tree.get_by_url('/folder/doc%d/title' % k)
+        self.assertIn('doc0', self.resident(tree))
+        self.assertEqual(tree.budget.evictions, 3)
+
+    def test_attribute_access_keeps_files_loaded(self):
+        tree = module.DataTree('testdata', lazy=True, memory_budget=int(self.size * 2.5))
+        for k in range(5):
+            tree.root.folder.doc0.title
+            tree.root.folder['doc%d' % k].title
+        self.assertIn('doc0', self.resident(tree))
+
+    def test_replaced_files_not_counted(self):
+        tree = module.DataTree('testdata', memory_budget=self.size * 10)
+        for k in range(5):
+            stream = open('testdata/folder/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Changed %d' % k, body='x' * 1000), stream)
+            stream.close()
+            os.utime('testdata/folder/doc%d.yaml' % k, ns=(0, k))
+        tree.refresh()
+        self.assertEqual(tree.budget.stats()['resident'], 5)
+        self.assertTrue(all([node.__parent__ is tree.root.folder for (node, size, reader) in tree.budget.nodes.values()]))
+        os.remove('testdata/folder/doc4.yaml')
+        tree.reload()
+        self.assertEqual(tree.budget.stats()['resident'], 4)
+        self.assertEqual(tree.budget.size, sum([size for (node, size, reader) in tree.budget.nodes.values()]))
+
+    def test_unloaded_from_current_version(self):
+        tree = module.DataTree('testdata', lazy=True, memory_budget=int(self.size * 2.5))
+        tree.get_by_url('/folder/doc0/title')
+        os.remove('testdata/folder/doc4.yaml')
+        old = tree.root
+        tree.reload()
+        for k in range(1, 4):
+            tree.get_by_url('/folder/doc%d/title' % k)
+        self.assertIsInstance(tree.root.folder.__children__['doc0'], module.LazyNode)
+        self.assertNotIsInstance(old.folder.__children__['doc0'], module.LazyNode)
+
+    def test_index_forgets_unloaded(self):
+        tree = module.DataTree('testdata', lazy=True, memory_budget=int(self.size * 1.5))
+        title = tree.get_by_url('/folder/doc0/title')
+        tree.get_by_url('/folder/doc1/title')
+        self.assertIsNot(tree.get_by_url('/folder/doc0/title'), title)
+        self.assertIsNone(tree.index.nodes.get('/folder/doc1/title'))
+
+    def test_stats(self):
+        tree = module.DataTree('testdata', memory_budget=int(self.size * 2.5))
+        budget = tree.stats()['budget']
+        self.assertEqual(budget['resident'], 2)
+        self.assertEqual(budget['evictions'], 3)
+        self.assertEqual(budget['reloads'], 0)
+
+class TestSnapshot(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        os.makedirs('testdata/folder2')
+        self.write('testdata/folder1/doc1.yaml', dict(title='Első', authors=['A', 'B'], year=None))
+        self.write('testdata/folder2/doc2.yaml', dict(title='Second'))
+        stream = open('testdata/folder2/table.csv', 'w')
+        stream.write('name,price\napple,1\npear,2\n')
+        stream.close()
+        self.tree = module.DataTree('testdata', columnar=True)
+        self.path = os.path.join('testdata', 'tree.snapshot')
+        self.tree.save_snapshot(self.path)
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def write(self, name, data):
+        stream = open(name, 'w')
+        yaml.dump(data, stream)
+        stream.close()
+
+    def test_same_tree(self):
+        tree = module.DataTree.load_snapshot(self.path)
+        self.assertDictEqual(tree.root.get_dictionary(), self.tree.root.get_dictionary())
+        self.assertEqual(tree.get_by_url('/folder1/doc1/authors/id1').get_data(), 'B')
+        self.assertEqual(tree.get_by_url('/folder1/doc1/year').get_data(), 'None')
+        self.assertEqual(tree.get_by_url('/folder2/table/id1/price').get_data(), '2')
+
+    def test_tables(self):
+        tree = module.DataTree('testdata', primary_keys=['name'], columnar=True, infer_types=True, typed=True)
+        tree.save_snapshot(self.path)
+        loaded = module.DataTree.load_snapshot(self.path)
+        table = loaded.root.folder2.table
+        self.assertIsInstance(table, module.TableNode)
+        self.assertIs(table.get_by_key('pear'), table.pear)
+        self.assertEqual(table.pear.price.get_data(), 2)
+        self.assertListEqual(list(table.get_column('price')), [1, 2])
+        self.assertDictEqual(table.get_dictionary(), tree.root.folder2.table.get_dictionary())
+        self.assertEqual(table.get_metadata('path'), os.path.normpath('testdata/folder2/table.csv'))
+        self.assertDictEqual(loaded.refresh(), dict(added=[], removed=[], modified=[]))
+
+    def test_metadata(self):
+        tree = module.DataTree.load_snapshot(self.path)
+        doc1 = tree.root.folder1.doc1
+        self.assertEqual(doc1.get_metadata('path'), os.path.normpath('testdata/folder1/doc1.yaml'))
+        self.assertEqual(doc1.get_metadata('mtime'), self.tree.root.folder1.doc1.get_metadata('mtime'))
+        self.assertEqual(doc1.title.get_verbose_name(), 'title')
+        self.assertListEqual(doc1.get_metadata('ordering'), list(self.tree.root.folder1.doc1.get_metadata('ordering')))
+
+    def test_nodes_built_on_access(self):
+        tree = module.DataTree.load_snapshot(self.path)
+        self.assertIsInstance(tree.root.__children__['folder1'], module.LazyNode)
+        tree.root.folder1
+        self.assertNotIsInstance(tree.root.__children__['folder1'], module.LazyNode)
+        self.assertIsInstance(tree.root.folder1.__children__['doc1'], module.LazyNode)
+
+    def test_not_a_snapshot(self):
+        self.write('testdata/fake.snapshot', dict(a=1))
+        self.assertRaises(ValueError, module.DataTree.load_snapshot, 'testdata/fake.snapshot')
+
+    def test_refresh(self):
+        tree = module.DataTree.load_snapshot(self.path)
+        self.assertDictEqual(tree.refresh(), dict(added=[], removed=[], modified=[]))
+        self.write('testdata/folder2/doc2.yaml', dict(title='Changed title'))
+        changes = tree.refresh()
+        self.assertListEqual(changes['modified'], [os.path.normpath('testdata/folder2/doc2.yaml')])
+        self.assertEqual(tree.root.folder2.doc2.title.get_data(), 'Changed title')
+
+    def test_refresh_with_reader_options(self):
+        self.write('testdata/.hidden.yaml', dict(title='Hidden'))
+        self.write('testdata/folder1/list.yaml', [dict(slug='p1'), dict(slug='p2')])
+        tree = module.DataTree('testdata', exclude=[r'^\..*$'], primary_keys=['slug'])
+        tree.save_snapshot(self.path)
+        tree = module.DataTree.load_snapshot(self.path)
+        self.assertNotIn('reader', tree.root.__meta__)
+        self.assertDictEqual(tree.refresh(), dict(added=[], removed=[], modified=[]))
+        self.write('testdata/folder1/list.yaml', [dict(slug='p1'), dict(slug='p2'), dict(slug='p3')])
+        tree.refresh()
+        self.assertListEqual(list(tree.root.folder1.list.get_metadata('ordering')), ['p1', 'p2', 'p3'])
+
+class TestAsyncDataTree(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        for k in range(5):
+            stream = open('testdata/folder1/doc%d.yaml' % k, 'w')
+            yaml.dump(dict(title='Document %d' % k), stream)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_get_by_url(self):
+        async def main():
+            tree = await module.AsyncDataTree.create('testdata', lazy=True)
+            node = await tree.get_by_url('/folder1/doc3/title')
+            return (tree, node)
+        (tree, node) = asyncio.run(main())
+        self.assertEqual(node.get_data(), 'Document 3')
+        self.assertIs(tree.tree.get_by_url('/folder1/doc3/title'), node)
+
+    def test_concurrent_requests_share_load(self):
+        async def main():
+            tree = await module.AsyncDataTree.create('testdata', lazy=True, instrument=True)
+            nodes = await asyncio.gather(*[tree.get_by_url('/folder1/doc%d' % (k % 2)) for k in range(20)])
+            return (tree, nodes)
+        (tree, nodes) = asyncio.run(main())
+        self.assertEqual(len(tree.tree.load_stats.files), 2)
+        self.assertEqual(len(set([id(node) for node in nodes])), 2)
+        self.assertDictEqual(tree.pending, {})
+
+    def test_missing(self):
+        async def main():
+            tree = await module.AsyncDataTree.create('testdata', lazy=True)
+            await tree.get_by_url('/folder1/doc9')
+        self.assertRaises(KeyError, asyncio.run, main())
+
+    def test_refresh(self):
+        async def main():
+            tree = await module.AsyncDataTree.create('testdata')
+            os.remove('testdata/folder1/doc4.yaml')
+            return await tree.refresh()
+        changes = asyncio.run(main())
+        self.assertListEqual(changes['removed'], [os.path.normpath('testdata/folder1/doc4.yaml')])
+
+class TestReload(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/folder1')
+        os.makedirs('testdata/folder2')
+        for name in ['testdata/folder1/doc1.yaml', 'testdata/folder1/doc2.yaml', 'testdata/folder2/doc3.yaml']:
+            self.write(name, dict(title=name))
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def write(self, name, data):
+        stream = open(name, 'w')
+        yaml.dump(data, stream)
+        stream.close()
+
+    def test_nothing_changed(self):
+        tree = module.DataTree('testdata')
+        root = tree.root
+        self.assertDictEqual(tree.reload(), dict(added=[], removed=[], modified=[]))
+        self.assertIs(tree.root, root)
+
+    def test_old_version_unchanged(self):
+        tree = module.DataTree('testdata')
+        old = tree.root
+        doc1 = old.folder1.doc1
+        self.write('testdata/folder1/doc1.yaml', dict(title='Changed title', extra='x'))
+        os.remove('testdata/folder2/doc3.yaml')
+        changes = tree.reload()
+        self.assertListEqual(changes['modified'], [os.path.normpath('testdata/folder1/doc1.yaml')])
+        self.assertListEqual(changes['removed'], [os.path.normpath('testdata/folder2/doc3.yaml')])
+        self.assertIsNot(tree.root, old)
+        self.assertIs(old.folder1.doc1, doc1)
+        self.assertEqual(old.folder1.doc1.title.get_data(), os.path.normpath('testdata/folder1/doc1.yaml'))
+        self.assertIn('doc3', old.folder2)
+        self.assertEqual(tree.get_by_url('/folder1/doc1/title').get_data(), 'Changed title')
+        self.assertNotIn('doc3', tree.root.folder2)
+
+    def test_unchanged_subtrees_shared(self):
+        tree = module.DataTree('testdata')
+        old = tree.root
+        self.write('testdata/folder2/doc3.yaml', dict(title='Changed title', extra='x'))
+        tree.reload()
+        self.assertIs(tree.root.folder1, old.folder1)
+        self.assertIs(tree.root.folder1.__parent__, tree.root)
+        self.assertIs(old.folder1.doc1, tree.root.folder1.doc1)
+        self.assertIsNot(tree.root.folder2, old.folder2)
+        self.assertIs(tree.root.folder2.__parent__, tree.root)
+        self.assertEqual(tree.root.folder1.doc1.get_absolute_url(), '/folder1/doc1')
+
+    def test_old_placeholders_not_resolved(self):
+        module.DataTree('testdata').save_snapshot('testdata/tree.snapshot')
+        tree = module.DataTree.load_snapshot('testdata/tree.snapshot')
+        old = tree.root
+        self.write('testdata/folder2/doc3.yaml', dict(title='Changed title', extra='x'))
+        self.assertListEqual(tree.reload()['modified'], [os.path.normpath('testdata/folder2/doc3.yaml')])
+        self.assertIsInstance(old.__children__['folder2'], module.LazyNode)
+        self.assertIsInstance(tree.root.__children__['folder1'], module.LazyNode)
+        self.assertEqual(tree.get_by_url('/folder2/doc3/title').get_data(), 'Changed title')
+        self.assertEqual(old.folder2.doc3.title.get_data(), os.path.normpath('testdata/folder2/doc3.yaml'))
+        self.assertIs(tree.root.folder2.doc3.__parent__, tree.root.folder2)
+
+    def test_old_version_freed(self):
+        def roots():
+            gc.collect()
+            return [id(node) for node in gc.get_objects() if isinstance(node, module.ContainerNode)
+                    and node.__name__ == 'testdata' and node.__parent__ is None]
+        tree = module.DataTree('testdata')
+        old = id(tree.root)
+        tree.glob('/**')
+        os.makedirs('testdata/folder3')
+        self.write('testdata/folder3/doc4.yaml', dict(title='New'))
+        tree.reload()
+        self.assertIn('folder3', tree.root)
+        for name in ['folder1', 'folder2', 'folder3']:
+            self.assertIs(tree.root[name].__parent__, tree.root)
+        self.assertIn(id(tree.root), roots())
+        self.assertNotIn(old, roots())
+        node = module.LiteralNode('extra')
+        tree.root.folder1.doc1.add_child(node)
+        self.assertListEqual(tree.glob('/folder1/doc1/extra'), [node])
+
+    def test_field_indexes_rebuilt(self):
+        tree = module.DataTree('testdata', indexes=[('/folder1', 'title')])
+        self.write('testdata/folder1/doc2.yaml', dict(title='Changed title', extra='x'))
+        tree.reload()
+        self.assertListEqual([node.__name__ for node in tree.query('/folder1').where('title', '==', 'Changed title')], ['doc2'])
+
+    def test_concurrent_readers(self):
+        tree = module.DataTree('testdata', lazy=True)
+        errors = []
+        stop = threading.Event()
+        def read():
+            while not stop.is_set():
+                try:
+                    title = tree.get_by_url('/folder1/doc1/title').get_data()
+                    self.assertIn(title, [os.path.normpath('testdata/folder1/doc1.yaml'), 'Version'])
+                except Exception as error:
+                    errors.append(error)
+        threads = [threading.Thread(target=read) for k in range(4)]
+        for thread in threads:
+            thread.start()
+        for k in range(20):
+            # readers of lazy nodes may open the file at any time
+            self.write('testdata/new.yaml', dict(title='Version', extra='x' * k))
+            os.replace('testdata/new.yaml', 'testdata/folder1/doc1.yaml')
+            tree.reload()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(errors, [])
+
+class TestUrlIndex(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/papers/published')
+        os.makedirs('testdata/papers/working')
+        for (name, title) in [('published/paper1', 'A'), ('published/paper2', 'B'), ('working/paper3', 'C')]:
+            stream = open('testdata/papers/%s.yaml' % name, 'w')
+            yaml.dump(dict(title=title, author='X'), stream)
+            stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def urls(self, nodes):
+        return [node.get_absolute_url() for node in nodes]
+
+    def test_lookup_is_indexed(self):
+        tree = module.DataTree('testdata')
+        node = tree.get_by_url('/papers/published/paper1/title')
+        self.assertIs(tree.index.lookup('/papers/published/paper1/title'), node)
+        self.assertIs(tree.get_by_url('/papers/published/paper1/title'), node)
+
+    def test_glob(self):
+        tree = module.DataTree('testdata')
+        self.assertListEqual(self.urls(tree.glob('/papers/published/*')),
+            ['/papers/published/paper1', '/papers/published/paper2'])
+        self.assertListEqual(self.urls(tree.glob('/papers/**/title')),
+            ['/papers/published/paper1/title', '/papers/published/paper2/title', '/papers/working/paper3/title'])
+        self.assertListEqual(self.urls(tree.glob('/*/work*')), ['/papers/working'])
+
+    def test_prefix(self):
+        tree = module.DataTree('testdata')
+        self.assertListEqual(self.urls(tree.get_by_prefix('/papers/working')),
+            ['/papers/working', '/papers/working/paper3', '/papers/working/paper3/author', '/papers/working/paper3/title'])
+
+    def test_index_follows_changes(self):
+        tree = module.DataTree('testdata')
+        old = tree.get_by_url('/papers/working/paper3/title')
+        self.assertEqual(len(tree.glob('/papers/working/*')), 1)
+        stream = open('testdata/papers/working/paper4.yaml', 'w')
+        yaml.dump(dict(title='D'), stream)
+        stream.close()
+        stream = open('testdata/papers/working/paper3.yaml', 'w')
+        yaml.dump(dict(title='Changed'), stream)
+        stream.close()
+        tree.refresh()
+        self.assertEqual(len(tree.glob('/papers/working/*')), 2)
+        new = tree.get_by_url('/papers/working/paper3/title')
+        self.assertIsNot(new, old)
+        self.assertEqual(new.get_data(), 'Changed')
+
+    def test_index_updated_in_place(self):
+        tree = module.DataTree('testdata', lazy=True)
+        tree.root.papers.published
+        tree.root.papers.working
+        self.assertListEqual(self.urls(tree.glob('/papers/*')), ['/papers/published', '/papers/working'])
+        urls = tree.index.urls
+        other = module.DataTree('testdata')
+        other.get_by_url('/papers/working/paper3/title').set_data('Changed')
+        module.LiteralNode('unrelated').set_data(2)
+        tree.root.papers.working.paper3
+        self.assertListEqual(self.urls(tree.get_by_prefix('/papers/working')),
+            ['/papers/working', '/papers/working/paper3', '/papers/working/paper3/author', '/papers/working/paper3/title'])
+        tree.root.papers.working.paper3.remove_child('author')
+        self.assertListEqual(self.urls(tree.glob('/papers/working/**')),
+            ['/papers/working', '/papers/working/paper3', '/papers/working/paper3/title'])
+        self.assertIs(tree.index.urls, urls)
+
+    def test_rows_not_indexed(self):
+        stream = open('testdata/papers/table.csv', 'w')
+        stream.write('a,b\n1,2\n3,4\n')
+        stream.close()
+        tree = module.DataTree('testdata', columnar=True)
+        self.assertListEqual(self.urls(tree.glob('/papers/table/*')), [])
+        urls = list(tree.index.urls)
+        self.assertEqual(tree.root.papers.table.id1.b.get_data(), '4')
+        self.assertListEqual(tree.index.urls, urls)
+
+    def test_rows_not_pinned(self):
+        stream = open('testdata/papers/table.csv', 'w')
+        stream.write('a,b\n1,2\n3,4\n')
+        stream.close()
+        tree = module.DataTree('testdata', columnar=True)
+        row = weakref.ref(tree.get_by_url('/papers/table/id0'))
+        self.assertEqual(tree.get_by_url('/papers/table/id1/b').get_data(), '4')
+        gc.collect()
+        self.assertIsNone(row())
+        self.assertListEqual(list(tree.index.nodes), [])
+
+    def test_removed_nodes_forgotten(self):
+        tree = module.DataTree('testdata')
+        tree.get_by_url('/papers/working/paper3/title')
+        tree.get_by_url('/papers/published/paper1')
+        os.remove('testdata/papers/working/paper3.yaml')
+        tree.refresh()
+        self.assertListEqual(list(tree.index.nodes), ['/papers/published/paper1'])
+
+    def test_only_own_tree_observed(self):
+        class Observer(object):
+            def __init__(self):
+                self.events = []
+            def _node_changed(self, names, container, event, old, new):
+                self.events.append((names, event))
+        tree = module.DataTree('testdata')
+        observer = Observer()
+        module._observe(observer, tree.root)
+        module.parse_object('root', [dict(title='x', author=dict(name='y'))])
+        other = module.DataTree('testdata')
+        other.get_by_url('/papers/published/paper1/title').set_data('Z')
+        self.assertListEqual(observer.events, [])
+        tree.get_by_url('/papers/published/paper1/title').set_data('Z')
+        self.assertListEqual(observer.events, [(['papers', 'published', 'paper1'], 'data')])
+        del observer
+        self.assertListEqual([root for (root, references) in module._OBSERVERS.values() if root is tree.root], [tree.root])
+
+    def test_cached_url_forgotten_when_moved(self):
+        father = module.ContainerNode('father')
+        child = module.ContainerNode('child')
+        grandchild = module.LiteralNode('grandchild')
+        child.add_child(grandchild)
+        self.assertEqual(grandchild.get_absolute_url(), '/grandchild')
+        father.add_child(child)
+        self.assertEqual(grandchild.get_absolute_url(), '/child/grandchild')
+        father.remove_child('child')
+        self.assertEqual(grandchild.get_absolute_url(), '/grandchild')
+
+class TestQuery(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata/papers')
+        papers = [dict(slug='p%d' % k, title='Paper %d' % k, author='Author %d' % (k % 3), year=2000 + k % 5,
+                       meta=dict(pages=10 + k)) for k in range(12)]
+        papers[11].pop('author')
+        stream = open('testdata/papers/published.yaml', 'w')
+        yaml.dump(papers, stream)
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def names(self, nodes):
+        return [node.__name__ for node in nodes]
+
+    def test_equality(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'])
+        result = tree.query('/papers/published').where('author', '==', 'Author 1').all()
+        self.assertListEqual(self.names(result), ['p1', 'p4', 'p7', 'p10'])
+
+    def test_indexes_give_same_results(self):
+        plain = module.DataTree('testdata', primary_keys=['slug'])
+        indexed = module.DataTree('testdata', primary_keys=['slug'],
+            indexes=[('/papers/published', 'author'), ('/papers/published', 'year', 'sorted')])
+        for (field, op, value) in [('author', '==', 'Author 2'), ('author', 'in', ['Author 0', 'Author 2']),
+                                   ('year', '>=', '2003'), ('year', '<', '2002'), ('year', '>', '2004'),
+                                   ('year', '<=', '2000'), ('year', '==', '2001'), ('author', '!=', 'Author 0')]:
+            expected = self.names(plain.query('/papers/published').where(field, op, value))
+            self.assertListEqual(self.names(indexed.query('/papers/published').where(field, op, value)), expected)
+
+    def test_combined_filters_order_limit(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'], indexes=[('/papers/published', 'year', 'sorted')])
+        query = tree.query('/papers/published').where('year', '>=', '2002').where('meta/pages', '<', '19')
+        self.assertListEqual(self.names(query.order_by('year', reverse=True).limit(3)), ['p4', 'p3', 'p8'])
+
+    def test_select(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'])
+        rows = tree.query('/papers/published').where('year', '==', '2001').select('title', 'author').all()
+        self.assertListEqual(rows, [dict(title='Paper 1', author='Author 1'), dict(title='Paper 6', author='Author 0'),
+                                    dict(title='Paper 11', author=None)])
+
+    def test_index_follows_changes(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'], indexes=[('/papers/published', 'author')])
+        tree.get_by_url('/papers/published/p0/author').set_data('Author 9')
+        result = tree.query('/papers/published').where('author', '==', 'Author 9').all()
+        self.assertListEqual(self.names(result), ['p0'])
+
+    def test_unknown_operator(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'])
+        self.assertRaises(ValueError, tree.query('/papers/published').where, 'year', '~', '2000')
+
+    def test_index_not_rebuilt_by_unrelated_changes(self):
+        tree = module.DataTree('testdata', primary_keys=['slug'], indexes=[('/papers/published', 'author')])
+        other = module.DataTree('testdata', primary_keys=['slug'])
+        index = tree.indexes['/papers/published']['author']
+        names = index.names
+        tree.get_by_url('/papers/published/p0/title').set_data('Changed')
+        other.get_by_url('/papers/published/p0/author').set_data('Author 9')
+        module.TableNode('table', ['a', 'b'], ['str', 'str'], [['1', '3'], ['2', '4']])[0]
+        self.assertListEqual(self.names(tree.query('/papers/published').where('author', '==', 'Author 0')), ['p0', 'p3', 'p6', 'p9'])
+        self.assertIs(index.names, names)
+
+    def test_index_follows_added_and_removed_children(self):
+        for kind in ('hash', 'sorted'):
+            plain = module.DataTree('testdata', primary_keys=['slug'])
+            indexed = module.DataTree('testdata', primary_keys=['slug'], indexes=[('/papers/published', 'year', kind)])
+            for tree in (plain, indexed):
+                papers = tree.get_by_url('/papers/published')
+                papers.remove_child('p3')
+                papers.remove_child('p7')
+                paper = module.ContainerNode('p12')
+                year = module.LiteralNode('year')
+                year.set_data('2001')
+                paper.add_child(year)
+                papers.add_child(paper)
+            for (op, value) in [('==', '2001'), ('in', ['2003', '2002']), ('<=', '2002'), ('>', '2002')]:
+                expected = self.names(plain.query('/papers/published').where('year', op, value))
+                self.assertListEqual(self.names(indexed.query('/papers/published').where('year', op, value)), expected)
+
 class TestParents(ut.TestCase):
     def test_cannot_have_more_parents(self):
         father = module.ContainerNode('father')
@@ -166,6 +1101,38 @@ description: >
         root = module.YAMLReader('testdata/layered.yaml').read()
         self.assertListEqual([root.a.get_data(), root.b.c.get_data(), root.b.d.get_data()], [u'1', u'2', u'3'])
 
+class TestStreamingYAMLReader(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata')
+        stream = open('testdata/log.yaml', 'w')
+        for k in range(100):
+            stream.write('---\nid: entry%d\nvalue: %d\n' % (k, k))
+        stream.close()
+        stream = open('testdata/single.yaml', 'w')
+        stream.write('a: 1\n')
+        stream.close()
+        stream = open('testdata/empty.yaml', 'w')
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_same_as_batch(self):
+        for name in ['log', 'single', 'empty']:
+            batch = module.YAMLReader('testdata/%s.yaml' % name, primary_keys='id').read()
+            streamed = module.YAMLReader('testdata/%s.yaml' % name, primary_keys='id', streaming=True).read()
+            self.assertEqual(unicode(streamed), unicode(batch))
+            self.assertEqual(streamed.get_metadata('path'), batch.get_metadata('path'))
+
+    def test_primary_keys(self):
+        node = module.YAMLReader('testdata/log.yaml', primary_keys=['id'], streaming=True).read()
+        self.assertEqual(node.entry42.value.get_data(), '42')
+        self.assertEqual(len(node), 100)
+
+    def test_data_tree(self):
+        tree = module.DataTree('testdata', streaming=True)
+        self.assertEqual(tree.root.log.id99.value.get_data(), '99')
+
 class TestJSONReader(ut.TestCase):
     def setUp(self):
         os.makedirs('testdata')
@@ -189,6 +1156,45 @@ class TestJSONReader(ut.TestCase):
         root = module.JSONReader('testdata/layered.json').read()
         self.assertListEqual([root.a.get_data(), root.b.c.get_data(), root.b.d.get_data()], [u'1', u'2', u'3'])
 
+class TestBackends(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata')
+        stream = open('testdata/layered.json', 'w')
+        stream.write('{"a": 1, "b": {"c": 2, "d": [3, 4]}}')
+        stream.close()
+        stream = open('testdata/layered.yaml', 'w')
+        stream.write('a: 1\nb:\n  c: 2\n  d: [3, 4]\n')
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_backends_agree(self):
+        expected = unicode(module.YAMLReader('testdata/layered.yaml').read())
+        for name in module.BACKENDS:
+            reader = module.JSONReader('testdata/layered.json')
+            reader.backends = [name]
+            self.assertEqual(unicode(reader.read()), expected)
+
+    def test_fallback_to_next_backend(self):
+        reader = module.JSONReader('testdata/layered.json')
+        reader.backends = ['missing', 'pyyaml']
+        self.assertEqual(reader.read().b.c.get_data(), '2')
+
+    def test_no_backend(self):
+        reader = module.YAMLReader('testdata/layered.yaml')
+        reader.backends = ['missing']
+        self.assertRaises(LookupError, reader.read)
+
+    def test_register_backend(self):
+        module.register_backend('constant', lambda stream: [dict(constant=True)])
+        try:
+            reader = module.YAMLReader('testdata/layered.yaml')
+            reader.backends = ['constant']
+            self.assertEqual(reader.read().constant.get_data(), 'True')
+        finally:
+            del module.BACKENDS['constant']
+
 class TestCSVReader(ut.TestCase):
     def setUp(self):
         os.makedirs('testdata')
@@ -211,6 +1217,269 @@ class TestCSVReader(ut.TestCase):
         node = module.CSVReader('testdata/root.csv').read()
         self.assertDictEqual(node.id2.get_dictionary(), dict(a=u'ő', b=u'ű', c=u'á'))
 
+class TestColumnarCSVReader(ut.TestCase):
+    def setUp(self):
+        os.makedirs('testdata')
+        stream = open('testdata/root.csv', 'wt', encoding='utf-8')
+        stream.write(u'''slug,count,price,flag,name
+first,1,2.5,true,ő
+second,2,3,false,ű
+third,3,4.25,TRUE,á
+''')
+        stream.close()
+
+    def tearDown(self):
+        rmtree('testdata')
+
+    def test_same_as_rows(self):
+        rows = module.CSVReader('testdata/root.csv').read()
+        table = module.CSVReader('testdata/root.csv', columnar=True).read()
+        self.assertIsInstance(table, module.TableNode)
+        self.assertEqual(unicode(table), unicode(rows))
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.id1.name.get_data(), u'ű')
+        self.assertListEqual([row.__name__ for row in table], ['id0', 'id1', 'id2'])
+
+    def test_primary_keys(self):
+        rows = module.CSVReader('testdata/root.csv', primary_keys=['slug']).read()
+        table = module.CSVReader('testdata/root.csv', primary_keys=['slug'], columnar=True).read()
+        self.assertEqual(unicode(table), unicode(rows))
+        self.assertEqual(table.second.count.get_data(), '2')
+        self.assertIn('third', table)
+        self.assertNotIn('id0', table)
+
+    def test_numeric_primary_key(self):
+        stream = open('testdata/keys.csv', 'w')
+        stream.write('id,name\n1,a\n2,b\n')
+        stream.close()
+        rows = module.CSVReader('testdata/keys.csv', primary_keys=['id']).read()
+        table = module.CSVReader('testdata/keys.csv', primary_keys=['id'], columnar=True, infer_types=True).read()
+        self.assertListEqual([row.__name__ for row in table], [row.__name__ for row in rows])
+        self.assertEqual(table._1.get_verbose_name(), '1')
+        self.assertIs(table.get_by_key(1), table[0])
+        self.assertEqual(table.get_by_key(2).name.get_data(), 'b')
+        self.assertRaises(KeyError, table.get_by_key, '2')
+
+    def test_rows_are_shared(self):
+        table = module.CSVReader('testdata/root.csv', columnar=True).read()
+        row = table.id0
+        self.assertIs(table['id0'], row)
+        self.assertIs(row.__parent__, table)
+        self.assertEqual(row.count.get_absolute_url(), '/id0/count')
+
+    def test_infer_types(self):
+        table = module.CSVReader('testdata/root.csv', columnar=True, infer_types=True).read()
+        self.assertEqual(table.get_column('count').tolist(), [1, 2, 3])
+        self.assertEqual(table.get_column('price').tolist(), [2.5, 3.0, 4.25])
+        self.assertEqual(table.get_column('flag').tolist(), [1, 0, 1])
+        self.assertListEqual(table.get_column('name'), [u'ő', u'ű', u'á'])
+        self.assertEqual(table.id2.flag.get_data(), 'True')
+
+    def test_missing_row(self):
+        table = module.CSVReader('testdata/root.csv', columnar=True).read()
+        self.assertRaises(KeyError, lambda: table.id3)
+
+    def test_data_tree(self):
+        tree = module.DataTree('testdata', columnar=True, infer_types=True)
+        self.assertEqual(tree.get_by_url('/root/id1/price').get_data(), '3.0')
+
+class TestTypedNodes(ut.TestCase):
+    def setUp(self):
+        self.obj = dict(year=2020, price=9.5, done=True, note=None, day=datetime.date(2020, 1, 2),
+                        counts=[3, 1, 2], prices=[1.5, 2, 3.5], mixed=[1, 'a'], flags=[True, False])
+        self.numpy = module.numpy
+
+    def tearDown(self):
+        module.numpy = self.numpy
+
+    def test_native_types(self):
+        root = module.parse_object('root', self.obj, typed=True)
+        self.assertIsInstance(root.year, module.TypedLiteralNode)
+        self.assertEqual(root.year.get_data(), 2020)
+        self.assertEqual(root.price.get_data(), 9.5)
+        self.assertIs(root.done.get_data(), True)
+        self.assertIsNone(root.note.get_data())
+        self.assertEqual(root.day.get_data(), datetime.date(2020, 1, 2))
+        self.assertEqual(unicode(root.year), '2020')
+        self.assertEqual(json.loads(unicode(root))['day'], '2020-01-02')
+
+    def test_untyped_by_default(self):
+        root = module.parse_object('root', self.obj)
+        self.assertEqual(root.year.get_data(), '2020')
+        self.assertEqual(root.counts.id0.get_data(), '3')
+        self.assertNotIsInstance(root.counts, module.ArrayNode)
+
+    def test_numeric_lists(self):
+        root = module.parse_object('root', self.obj, typed=True)
+        self.assertIsInstance(root.counts, module.ArrayNode)
+        self.assertIsInstance(root.prices, module.ArrayNode)
+        self.assertNotIsInstance(root.mixed, module.ArrayNode)
+        self.assertNotIsInstance(root.flags, module.ArrayNode)
+        self.assertEqual(root.prices.get_list(), [1.5, 2.0, 3.5])
+        self.assertIsInstance(root.flags.id0.get_data(), bool)
+
+    def test_array_items(self):
+        counts = module.parse_object('root', self.obj, typed=True).counts
+        self.assertEqual(counts.id1.get_data(), 1)
+        self.assertIsInstance(counts.id1.get_data(), int)
+        self.assertEqual(counts.id1.get_absolute_url(), '/counts/id1')
+        self.assertEqual(counts[2], 2)
+        self.assertEqual(list(counts[1:]), [1, 2])
+        self.assertListEqual([node.get_data() for node in counts], [3, 1, 2])
+        self.assertEqual(len(counts), 3)
+        self.assertIn('id2', counts)
+        self.assertNotIn('id3', counts)
+        self.assertDictEqual(counts.get_dictionary(), dict(id0=3, id1=1, id2=2))
+        self.assertRaises(TypeError, counts.add_child, module.LiteralNode('x'))
+
+    def test_aggregations(self):
+        root = module.parse_object('root', self.obj, typed=True)
+        self.assertEqual(root.counts.sum(), 6)
+        self.assertEqual(root.counts.mean(), 2.0)
+        self.assertEqual(root.counts.min(), 1)
+        self.assertEqual(root.prices.max(), 3.5)
+
+    @ut.skipIf(module.numpy is None, 'NumPy is not installed')
+    def test_numpy_array(self):
+        counts = module.parse_object('root', self.obj, typed=True).counts
+        self.assertIsInstance(counts.get_array(), module.numpy.ndarray)
+        self.assertEqual(counts.get_array().dtype, module.numpy.int64)
+
+    def test_without_numpy(self):
+        module.numpy = None
+        root = module.parse_object('root', self.obj, typed=True)
+        self.assertIsInstance(root.prices.get_array(), array.array)
+        self.assertEqual(root.prices.mean(), 7.0 / 3)
+        self.assertEqual(root.counts[0], 3)
+
+    def test_reader(self):
+        os.makedirs('testdata')
+        try:
+            stream = open('testdata/doc.yaml', 'w')
+            yaml.dump(self.obj, stream)
+            stream.close()
+            stream = open('testdata/table.csv', 'w')
+            stream.write('name,price\napple,1.5\n')
+            stream.close()
+            tree = module.DataTree('testdata', typed=True, columnar=True, infer_types=True)
+            self.assertEqual(tree.root.doc.counts.sum(), 6)
+            self.assertEqual(tree.root.table.id0.price.get_data(), 1.5)
+            path = 'testdata/tree.snapshot'
+            tree.save_snapshot(path)
+            loaded = module.DataTree.load_snapshot(path)
+            self.assertEqual(loaded.root.doc.counts.sum(), 6)
+            self.assertEqual(loaded.root.doc.counts.get_verbose_name(), 'counts')
+            self.assertIs(loaded.root.doc.done.get_data(), True)
+            self.assertEqual(loaded.root.table.id0.price.get_data(), 1.5)
+        finally:
+            rmtree('testdata')
+
+class TestColumns(ut.TestCase):
+    def setUp(self):
+        self.records = [dict(title='A', year=2001, score=1.5, ok=True, author=dict(name='X')),
+                        dict(title='B', year=2002, score=2.5, ok=False),
+                        dict(title='C', year=2003, ok=True, author=dict(name='Z'))]
+        self.numpy = module.numpy
+
+    def tearDown(self):
+        module.numpy = self.numpy
+
+    def values(self, column):
+        return list(column.tolist() if hasattr(column, 'tolist') else column)
+
+    def test_typed(self):
+        node = module.parse_object('root', self.records, typed=True)
+        columns = node.to_columns(['year', 'author/name', 'score', 'ok'])
+        self.assertListEqual(self.values(columns['year']), [2001, 2002, 2003])
+        self.assertListEqual(columns['author/name'], ['X', None, 'Z'])
+        self.assertListEqual(columns['score'], [1.5, 2.5, None])
+        self.assertListEqual(self.values(columns['ok']), [True, False, True])
+
+    def test_missing(self):
+        node = module.parse_object('root', self.records, typed=True)
+        score = node.to_columns(['score'], missing=float('nan'))['score']
+        self.assertEqual(self.values(score)[:2], [1.5, 2.5])
+        self.assertNotEqual(score[2], score[2])
+
+    def test_default_fields(self):
+        node = module.parse_object('root', self.records)
+        self.assertListEqual(list(node.to_columns()), ['title', 'year', 'score', 'ok'])
+
+    def test_infer_types(self):
+        node = module.parse_object('root', self.records)
+        self.assertListEqual(node.to_columns(['year'])['year'], ['2001', '2002', '2003'])
+        columns = node.to_columns(['year', 'ok', 'title'], infer_types=True)
+        self.assertListEqual(self.values(columns['year']), [2001, 2002, 2003])
+        self.assertListEqual(self.values(columns['ok']), [True, False, True])
+        self.assertListEqual(columns['title'], ['A', 'B', 'C'])
+
+    @ut.skipIf(module.numpy is None, 'NumPy is not installed')
+    def test_numpy(self):
+        node = module.parse_object('root', self.records, typed=True)
+        columns = node.to_columns(['year', 'ok'])
+        self.assertEqual(columns['year'].dtype, module.numpy.int64)
+        self.assertEqual(columns['ok'].dtype, bool)
+
+    def test_without_numpy(self):
+        module.numpy = None
+        node = module.parse_object('root', self.records, typed=True)
+        self.assertIsInstance(node.to_columns(['year'])['year'], array.array)
+
+    def test_dataframe(self):
+        try:
+            import pandas
+        except ImportError:
+            self.skipTest('pandas is not installed')
+        frame = module.parse_object('root', self.records, typed=True).to_dataframe(['year', 'author/name'])
+        self.assertListEqual(list(frame.index), ['id0', 'id1', 'id2'])
+        self.assertListEqual(list(frame['year']), [2001, 2002, 2003])
+
+    def test_table(self):
+        os.makedirs('testdata')
+        try:
+            stream = open('testdata/table.csv', 'w')
+            stream.write('name,price,count\napple,1.5,3\npear,2\n')
+            stream.close()
+            tree = module.DataTree('testdata', columnar=True, infer_types=True)
+            columns = tree.root.table.to_columns(['price', 'count', 'color'], missing='')
+            self.assertListEqual(self.values(columns['price']), [1.5, 2.0])
+            self.assertListEqual(columns['count'], ['3', ''])
+            self.assertListEqual(columns['color'], ['', ''])
+            self.assertListEqual(list(tree.root.table.to_columns()), ['name', 'price', 'count'])
+        finally:
+            rmtree('testdata')
+
+class TestSlugCache(ut.TestCase):
+    def tearDown(self):
+        module.set_normalizer(None)
+
+    def test_cached(self):
+        module.admissible_slug.cache_clear()
+        for k in range(100):
+            module.parse_object('root', dict(title='x', year=k))
+        info = module.admissible_slug.cache_info()
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.hits, 297)
+
+    def test_bounded(self):
+        for k in range(module.SLUG_CACHE_SIZE + 10):
+            module.admissible_slug('name%d' % k)
+        self.assertEqual(module.admissible_slug.cache_info().currsize, module.SLUG_CACHE_SIZE)
+
+    def test_errors_not_cached(self):
+        self.assertRaises(NameError, module.admissible_slug, 'get_data')
+        self.assertRaises(NameError, module.admissible_slug, 'get_data')
+
+    def test_custom_normalizer(self):
+        module.admissible_slug('Two Words')
+        module.set_normalizer(lambda name: name.lower().replace(' ', ''))
+        node = module.LiteralNode('Two Words')
+        self.assertEqual(node.__name__, 'twowords')
+        self.assertEqual(node.get_verbose_name(), 'Two Words')
+        self.assertRaises(NameError, module.LiteralNode, '__init__')
+        module.set_normalizer(None)
+        self.assertEqual(module.LiteralNode('Two Words').__name__, 'two_words')
+
 class TestDictParser(ut.TestCase):
     def test_root_node(self):
         node = module.parse_object('root', {})
@@ -267,6 +1536,31 @@ class TestDictParser(ut.TestCase):
         root = module.parse_object('root', {'a': 1, 'b': {'c': 2, 'd': 3}})
         self.assertListEqual([root.a.get_data(), root.b.c.get_data(), root.b.d.get_data()], [u'1', u'2', u'3'])
 
+    def test_nested_lists_and_dicts(self):
+        obj = dict(z=[dict(slug='s1', x=[1, {}]), dict(y=[]), 3], a=dict(b=dict(c='d')), e=None)
+        root = module.parse_object('root', obj, primary_keys='slug')
+        self.assertEqual(unicode(root), '{"z": {"s1": {"slug": "s1", "x": {"id0": "1", "id1": {}}}, "id1": {"y": {}}, "id2": "3"}, '
+                                        '"a": {"b": {"c": "d"}}, "e": "None"}')
+        self.assertListEqual(root.get_metadata('ordering'), ['z', 'a', 'e'])
+        self.assertIs(root.z.s1.x.id1.__parent__, root.z.s1.x)
+
+    def test_deep_document(self):
+        obj = 'leaf'
+        for k in range(10000):
+            obj = dict(level=obj)
+        node = module.parse_object('root', obj)
+        for k in range(10000):
+            node = node.level
+        self.assertEqual(node.get_data(), 'leaf')
+
+    def test_name_errors(self):
+        for (obj, message) in [([dict(slug='a'), dict(slug='a', x=[dict(slug='in')])], 'Children must have unique names. node = /'),
+                               (dict(a=[dict(b=1)], c={'get_data': 1}), 'get_data is not an admissible name. node = get_data'),
+                               (dict(a=dict(b=1), A=[1]), 'Children must have unique names. node = /')]:
+            with self.assertRaises(NameError) as context:
+                module.parse_object('root', obj, primary_keys='slug')
+            self.assertEqual(str(context.exception), message)
+
 
 class TestInterface(ut.TestCase):
     def test_numerical_name(self):
@@ -379,6 +1673,37 @@ class TestExceptions(ut.TestCase):
         for word in RESERVED_WORDS:
             self.assertRaises(NameError, callable, word)
 
+class TestAddChildren(ut.TestCase):
+    def test_add_children(self):
+        node = module.ContainerNode('test')
+        children = [module.LiteralNode(name) for name in ['c', 'a', 'b']]
+        node.add_children(children)
+        self.assertListEqual(list(node), children)
+        self.assertIs(children[0].__parent__, node)
+
+    def test_duplicate_in_batch(self):
+        node = module.ContainerNode('test')
+        children = [module.LiteralNode(name) for name in ['a', 'b', 'a']]
+        self.assertRaises(NameError, node.add_children, children)
+
+    def test_duplicate_of_existing(self):
+        node = module.ContainerNode('test')
+        node.add_child(module.LiteralNode('a'))
+        self.assertRaises(NameError, node.add_children, [module.LiteralNode('a')])
+
+    def test_child_with_parent(self):
+        node = module.ContainerNode('test')
+        other = module.ContainerNode('other')
+        child = module.LiteralNode('a')
+        other.add_child(child)
+        self.assertRaises(ValueError, node.add_children, [child])
+
+    def test_ordering_kept_in_meta(self):
+        node = module.ContainerNode('test')
+        node.set_metadata(priority=1)
+        node.add_children([module.LiteralNode(name) for name in ['b', 'a']])
+        self.assertListEqual(node.__meta__['ordering'], ['b', 'a'])
+
 class TestIteration(ut.TestCase):
     def test_node_is_iterable(self):
         node = module.ContainerNode('test')
@@ -476,6 +1801,65 @@ class TestIteration(ut.TestCase):
         node.add_child(b)
         self.assertEqual(unicode(node), u'{"a": "1", "b": "2"}')
 
+class TestCompactNodes(ut.TestCase):
+    def test_no_instance_dictionary(self):
+        for cls in [module.LiteralNode, module.ContainerNode, module.LazyNode, module.TableNode]:
+            self.assertEqual(cls.__dictoffset__, 0)
+
+    def test_verbose_name_without_meta(self):
+        node = module.LiteralNode('Two Words')
+        self.assertEqual(node.get_verbose_name(), 'Two Words')
+        self.assertEqual(module.LiteralNode('plain').get_verbose_name(), 'plain')
+
+    def test_ordering_follows_meta(self):
+        node = module.ContainerNode('test')
+        for name in ['a', 'b', 'c']:
+            node.add_child(module.LiteralNode(name))
+        self.assertListEqual(node.__meta__['ordering'], ['a', 'b', 'c'])
+        node.__meta__['ordering'].reverse()
+        node.add_child(module.LiteralNode('d'))
+        self.assertListEqual([child.__name__ for child in node], ['c', 'b', 'a', 'd'])
+
+class TestExport(ut.TestCase):
+    def setUp(self):
+        self.root = module.parse_object('root', dict(b=dict(c=1, d=[1, 2, dict(e='x "y"')]), a='á', empty={}))
+
+    def export(self, function, node, depth=None):
+        stream = io.StringIO()
+        function(node, stream, depth)
+        return stream.getvalue()
+
+    def test_json_same_as_string(self):
+        self.assertEqual(self.export(module.export_json, self.root), unicode(self.root))
+
+    def test_yaml_round_trip(self):
+        self.assertDictEqual(yaml.safe_load(self.export(module.export_yaml, self.root)), self.root.get_dictionary())
+
+    def test_follows_ordering(self):
+        self.root.__meta__['ordering'].reverse()
+        self.assertEqual(self.export(module.export_json, self.root)[:10], '{"empty": ')
+        self.assertEqual(self.export(module.export_yaml, self.root)[:8], '"empty":')
+
+    def test_depth(self):
+        expected = {'b': {'c': '1', 'd': '/b/d'}, 'a': u'á', 'empty': {}}
+        self.assertDictEqual(json.loads(self.export(module.export_json, self.root, 2)), expected)
+        self.assertDictEqual(yaml.safe_load(self.export(module.export_yaml, self.root, 2)), expected)
+        self.assertEqual(json.loads(self.export(module.export_json, self.root, 0)), '/')
+
+    def test_literal(self):
+        self.assertEqual(self.export(module.export_json, self.root.b.c), '"1"')
+        self.assertEqual(yaml.safe_load(self.export(module.export_yaml, self.root.b.c)), '1')
+
+    def test_deep_tree(self):
+        node = module.ContainerNode('root')
+        leaf = node
+        for k in range(5000):
+            child = module.ContainerNode('level')
+            leaf.add_child(child)
+            leaf = child
+        text = self.export(module.export_json, node)
+        self.assertEqual(text, '{' + '"level": {' * 5000 + '}' * 5001)
+
 class TestLookup(ut.TestCase):
     def test_attribute(self):
         node = module.ContainerNode('test')
@@ -507,6 +1891,99 @@ class TestLookup(ut.TestCase):
         self.assertEqual(node['a'], a)
         self.assertEqual(node['b'], b)
 
+class TestKeyedList(ut.TestCase):
+    def setUp(self):
+        data = [dict(slug='Becker 1981', year=1981), dict(slug='Coase', year=1960), dict(year=2000)]
+        self.node = module.parse_object('papers', data, ['slug'])
+
+    def test_list_node(self):
+        self.assertIsInstance(self.node, module.ListNode)
+        node = module.parse_object('root', dict(papers=[1, 2], title='x'))
+        self.assertIsInstance(node.papers, module.ListNode)
+        self.assertNotIsInstance(node, module.ListNode)
+
+    def test_position(self):
+        self.assertIs(self.node[0], self.node.becker_1981)
+        self.assertIs(self.node[1], self.node.coase)
+        self.assertIs(self.node[-1], self.node.id2)
+        self.assertRaises(IndexError, lambda: self.node[3])
+
+    def test_slice(self):
+        self.assertEqual(self.node[1:], [self.node.coase, self.node.id2])
+        self.assertEqual(self.node[::-1][0], self.node.id2)
+
+    def test_folder_position(self):
+        node = module.ContainerNode('test')
+        node.add_children([module.LiteralNode('b'), module.LiteralNode('a')])
+        self.assertEqual(node[0].__name__, 'b')
+        self.assertEqual([child.__name__ for child in node[:]], ['b', 'a'])
+
+    def test_get_by_key(self):
+        self.assertIs(self.node.get_by_key('Becker 1981'), self.node.becker_1981)
+        self.assertIs(self.node.get_by_key('Coase'), self.node.coase)
+
+    def test_missing_key(self):
+        self.assertRaises(KeyError, self.node.get_by_key, 'Stigler')
+        # same slug, different key
+        self.assertRaises(KeyError, self.node.get_by_key, 'becker_1981')
+        self.assertRaises(KeyError, self.node.get_by_key, 1981)
+        self.assertRaises(KeyError, self.node.get_by_key, '')
+
+    def test_integer_keys(self):
+        os.makedirs('testdata')
+        try:
+            stream = open('testdata/papers.json', 'w')
+            json.dump([dict(id=1, title='A'), dict(id=20, title='B')], stream)
+            stream.close()
+            tree = module.DataTree('testdata', primary_keys=['id'])
+            papers = tree.root.papers
+            self.assertListEqual(list(papers._keys()), ['_1', '_20'])
+            self.assertIs(papers.get_by_key(20), papers._20)
+            self.assertEqual(papers.get_by_key(1).title.get_data(), 'A')
+            self.assertRaises(KeyError, papers.get_by_key, '1')
+            self.assertRaises(KeyError, papers.get_by_key, 2)
+        finally:
+            rmtree('testdata')
+
+    def test_item_name(self):
+        self.assertEqual(module.item_name(3, dict(slug='a'), ['id', 'slug']), 'a')
+        self.assertEqual(module.item_name(3, ['slug'], ['slug']), 'id3')
+        self.assertEqual(module.item_name(3, 'slug', 'slug'), 'id3')
+
+    def test_table(self):
+        node = module.TableNode('papers', ['slug', 'year'], ['str', 'int'],
+                                [['Becker 1981', 'Coase'], [1981, 1960]], ['slug'], typed=True)
+        self.assertEqual(node[1].year.get_data(), 1960)
+        self.assertEqual([row.__name__ for row in node[:]], ['becker_1981', 'coase'])
+        self.assertIs(node.get_by_key('Coase'), node.coase)
+        self.assertRaises(KeyError, node.get_by_key, 'coase')
+        node = module.TableNode('papers', ['year'], ['int'], [[1981, 1960]], typed=True)
+        self.assertEqual(node[-1].year.get_data(), 1960)
+        self.assertRaises(KeyError, node.get_by_key, 'id0')
+
+    def test_typed_table_dictionary(self):
+        columns = [['Becker 1981', 'Coase'], module.numeric_array([1981, 1960]), module.numeric_array([1, 0])]
+        node = module.TableNode('papers', ['slug', 'year', 'cited'], ['str', 'int', 'bool'], columns, ['slug'], typed=True)
+        self.assertDictEqual(node.get_dictionary(), dict(becker_1981=dict(slug='Becker 1981', year=1981, cited=True),
+                                                         coase=dict(slug='Coase', year=1960, cited=False)))
+        self.assertIs(type(node.get_dictionary()['coase']['year']), int)
+        self.assertDictEqual(node.get_dictionary(), dict([(row.__name__, row.get_dictionary()) for row in node]))
+        node = module.TableNode('papers', ['slug', 'year', 'cited'], ['str', 'int', 'bool'], columns, ['slug'])
+        self.assertDictEqual(node.get_dictionary()['coase'], dict(slug='Coase', year='1960', cited='False'))
+
+    def test_snapshot(self):
+        os.makedirs('testdata')
+        try:
+            root = module.ContainerNode('root')
+            root.add_child(self.node)
+            module.save_snapshot(root, 'testdata/tree.snapshot')
+            node = module.Snapshot('testdata/tree.snapshot').node(0).papers
+            self.assertIsInstance(node, module.ListNode)
+            self.assertEqual(node.get_by_key('Becker 1981').year.get_data(), '1981')
+            self.assertEqual(node[1].__name__, 'coase')
+        finally:
+            rmtree('testdata')
+
 
 if __name__=='__main__':
     ut.main()